@@ -0,0 +1,258 @@
+# adzuna_client.py
+import os
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+import metrics
+
+load_dotenv()
+
+ADZUNA_APP_ID = os.getenv("ADZUNA_APP_ID")
+ADZUNA_APP_KEY = os.getenv("ADZUNA_APP_KEY")
+
+# بعد ADZUNA_CACHE_TTL نرجع النسخة القديمة ونحدّث بالخلفية،
+# وبعد ADZUNA_MAX_STALE لازم نجيب من Adzuna مباشرة
+ADZUNA_CACHE_TTL = float(os.getenv("ADZUNA_CACHE_TTL", str(60 * 60)))
+ADZUNA_MAX_STALE = float(os.getenv("ADZUNA_MAX_STALE", str(24 * 60 * 60)))
+ADZUNA_CACHE_ENTRIES = int(os.getenv("ADZUNA_CACHE_ENTRIES", "1024"))
+ADZUNA_POOL_SIZE = int(os.getenv("ADZUNA_POOL_SIZE", "20"))
+ADZUNA_TIMEOUT = float(os.getenv("ADZUNA_TIMEOUT", "20"))
+# token bucket على كل الطلبات لـ Adzuna (لازم يطابق الـ quota تبعنا)
+ADZUNA_RATE_PER_SEC = float(os.getenv("ADZUNA_RATE_PER_SEC", "2"))
+ADZUNA_BURST = int(os.getenv("ADZUNA_BURST", "10"))
+
+# ADZUNA_BASE_URL=http://127.0.0.1:8765/v1/api للـ stub المحلي (adzuna_stub.py)
+ADZUNA_BASE_URL = os.getenv("ADZUNA_BASE_URL", "https://api.adzuna.com/v1/api").rstrip("/")
+BASE_URL = ADZUNA_BASE_URL + "/jobs/{country}/search/{page}"
+
+
+class TokenBucket:
+    """`rate` requests per second on average, bursts of up to `capacity`."""
+
+    def __init__(self, rate=ADZUNA_RATE_PER_SEC, capacity=ADZUNA_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def _take(self):
+        """Takes a token and returns 0, or returns how long to wait for one."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            wait = (1 - self.tokens) / self.rate
+            self.waited += wait
+            return wait
+
+    def acquire(self):
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+def make_key(country, keyword, results_per_page):
+    """Normalized cache key: ("us", "software engineer", 15)."""
+    country = (country or "us").strip().lower()
+    keyword = " ".join((keyword or "").lower().split())
+    return country, keyword, int(results_per_page)
+
+
+class AdzunaClient:
+    """
+    Shared Adzuna search client: one pooled keep-alive session for sync
+    callers, one for async callers, and a TTL cache in front of both that
+    serves stale entries while a background refresh is in flight.
+    """
+
+    def __init__(self, ttl=ADZUNA_CACHE_TTL, max_stale=ADZUNA_MAX_STALE,
+                 max_entries=ADZUNA_CACHE_ENTRIES, pool_size=ADZUNA_POOL_SIZE,
+                 timeout=ADZUNA_TIMEOUT):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.async_http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+        self.bucket = TokenBucket()
+        self._cache = OrderedDict()  # key -> (fetched_at, results)
+        self._refreshing = set()
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    # ---------- HTTP ----------
+    def _request(self, key, page=1, base_url=BASE_URL):
+        country, keyword, results_per_page = key
+        params = {
+            "app_id": ADZUNA_APP_ID,
+            "app_key": ADZUNA_APP_KEY,
+            "results_per_page": results_per_page,
+            "what": keyword,
+            "content-type": "application/json",
+        }
+        return base_url.format(country=country, page=page), params
+
+    def _fetch(self, key):
+        url, params = self._request(key)
+        self.bucket.acquire()
+        try:
+            with metrics.timed("adzuna_http"):
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            if response.status_code != 200:
+                print(f"[Adzuna] ❌ فشل الاتصال بالكود: {response.status_code}")
+                metrics.failures.inc("adzuna", str(response.status_code))
+                return None
+            return response.json().get("results", [])
+        except Exception as e:
+            print(f"[Adzuna] ⚠️ خطأ أثناء جلب البيانات: {e}")
+            metrics.failures.inc("adzuna", type(e).__name__)
+            return None
+
+    async def _fetch_async(self, key):
+        url, params = self._request(key)
+        await self.bucket.acquire_async()
+        try:
+            with metrics.timed("adzuna_http"):
+                response = await self.async_http.get(url, params=params)
+            if response.status_code != 200:
+                print(f"[Adzuna] ❌ فشل الاتصال بالكود: {response.status_code}")
+                metrics.failures.inc("adzuna", str(response.status_code))
+                return None
+            return response.json().get("results", [])
+        except Exception as e:
+            print(f"[Adzuna] ⚠️ خطأ أثناء جلب البيانات: {e}")
+            metrics.failures.inc("adzuna", type(e).__name__)
+            return None
+
+    # ---------- cache ----------
+    def _lookup(self, key):
+        """Returns (results, state) with state in fresh / stale / miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, "miss"
+            fetched_at, results = entry
+            age = now - fetched_at
+            if age < self.ttl:
+                self._cache.move_to_end(key)
+                self.fresh_hits += 1
+                return results, "fresh"
+            if age < self.max_stale:
+                self.stale_hits += 1
+                return results, "stale"
+            del self._cache[key]
+            self.misses += 1
+            return None, "miss"
+
+    def _store(self, key, results):
+        with self._lock:
+            self._cache[key] = (time.time(), results)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _claim_refresh(self, key):
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def _refresh(self, key):
+        try:
+            results = self._fetch(key)
+            if results is not None:
+                self._store(key, results)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    async def _refresh_async(self, key):
+        try:
+            results = await self._fetch_async(key)
+            if results is not None:
+                self._store(key, results)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    # ---------- public API ----------
+    def search(self, country="us", keyword="", results_per_page=10):
+        """Job results for page 1 of the search, [] when Adzuna fails."""
+        key = make_key(country, keyword, results_per_page)
+        results, state = self._lookup(key)
+        if state == "stale" and self._claim_refresh(key):
+            threading.Thread(target=self._refresh, args=(key,), daemon=True).start()
+        if results is not None:
+            return results
+
+        results = self._fetch(key)
+        if results is None:
+            return []
+        self._store(key, results)
+        return results
+
+    async def search_async(self, country="us", keyword="", results_per_page=10):
+        """Async version of search (stale refreshes run as a background task)."""
+        key = make_key(country, keyword, results_per_page)
+        results, state = self._lookup(key)
+        if state == "stale" and self._claim_refresh(key):
+            task = asyncio.create_task(self._refresh_async(key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        if results is not None:
+            return results
+
+        results = await self._fetch_async(key)
+        if results is None:
+            return []
+        self._store(key, results)
+        return results
+
+    def stats(self) -> dict:
+        total = self.fresh_hits + self.stale_hits + self.misses
+        return {
+            "fresh_hits": self.fresh_hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.fresh_hits + self.stale_hits) / total, 4) if total else 0.0,
+            "entries": len(self._cache),
+            "refreshing": len(self._refreshing),
+            "rate_limit_wait_s": round(self.bucket.waited, 3),
+        }
+
+
+adzuna = AdzunaClient()
@@ -0,0 +1,195 @@
+# adzuna_harvester.py
+"""
+Multi-page Adzuna harvester.
+
+Pages are fetched in waves of `concurrency` requests over one pooled
+httpx client, every request goes through the Adzuna token bucket
+(ADZUNA_RATE_PER_SEC / ADZUNA_BURST), 429s and 5xx are retried with
+backoff (Retry-After wins when present), and postings are de-duplicated by
+Adzuna job id. After each wave we count how many skills we had not seen
+before per new posting; once that drops under HARVEST_MIN_NEW_SKILL_RATE
+further pages are not worth the quota and we stop.
+
+Local run against the stub server (see adzuna_stub.py):
+    python adzuna_harvester.py "data analyst" --pages 20 --stub
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter
+import httpx
+from dotenv import load_dotenv
+from adzuna_client import adzuna, make_key, BASE_URL, ADZUNA_TIMEOUT
+from skill_extractor import count_skills
+import metrics
+
+load_dotenv()
+
+HARVEST_MAX_PAGES = int(os.getenv("HARVEST_MAX_PAGES", "10"))
+HARVEST_RESULTS_PER_PAGE = int(os.getenv("HARVEST_RESULTS_PER_PAGE", "50"))
+HARVEST_CONCURRENCY = int(os.getenv("HARVEST_CONCURRENCY", "4"))
+# أقل من مهارة جديدة لكل 20 وظيفة جديدة = وقف
+HARVEST_MIN_NEW_SKILL_RATE = float(os.getenv("HARVEST_MIN_NEW_SKILL_RATE", "0.05"))
+HARVEST_MAX_RETRIES = int(os.getenv("HARVEST_MAX_RETRIES", "4"))
+HARVEST_BACKOFF = float(os.getenv("HARVEST_BACKOFF", "0.5"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _retry_after(response, attempt):
+    value = response.headers.get("Retry-After")
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return HARVEST_BACKOFF * (2 ** attempt) * (0.5 + random.random())
+
+
+async def fetch_page(http, key, page, stats, base_url=BASE_URL):
+    """Results of one page, or None when it failed after all retries."""
+    url, params = adzuna._request(key, page, base_url)
+    for attempt in range(HARVEST_MAX_RETRIES + 1):
+        await adzuna.bucket.acquire_async()
+        try:
+            with metrics.timed("adzuna_http"):
+                response = await http.get(url, params=params)
+        except httpx.HTTPError as e:
+            print(f"[Harvester] ⚠️ page {page}: {e}")
+            metrics.failures.inc("adzuna", type(e).__name__)
+            await asyncio.sleep(HARVEST_BACKOFF * (2 ** attempt))
+            stats["retries"] += 1
+            continue
+
+        if response.status_code == 200:
+            return response.json().get("results", [])
+        metrics.failures.inc("adzuna", str(response.status_code))
+        if response.status_code not in RETRY_STATUSES:
+            print(f"[Harvester] ❌ page {page}: {response.status_code}")
+            return None
+        if response.status_code == 429:
+            stats["throttled"] += 1
+        stats["retries"] += 1
+        await asyncio.sleep(_retry_after(response, attempt))
+
+    print(f"[Harvester] ❌ page {page}: retries exhausted")
+    return None
+
+
+async def harvest_async(country="us", keyword="", max_pages=HARVEST_MAX_PAGES,
+                        results_per_page=HARVEST_RESULTS_PER_PAGE, concurrency=HARVEST_CONCURRENCY,
+                        min_new_skill_rate=HARVEST_MIN_NEW_SKILL_RATE, http=None, base_url=BASE_URL):
+    """
+    {"jobs": [...unique postings...], "skills": Counter, "pages": n, "stop_reason": str, ...}
+    Uses adzuna.async_http unless another pooled client is passed in.
+    """
+    http = http or adzuna.async_http
+    key = make_key(country, keyword, results_per_page)
+    started = time.perf_counter()
+    stats = {"retries": 0, "throttled": 0, "duplicates": 0, "failed_pages": 0}
+    jobs = {}
+    skills = Counter()
+    pages = 0
+    stop_reason = "max_pages"
+
+    next_page = 1
+    while next_page <= max_pages:
+        wave = range(next_page, min(next_page + concurrency, max_pages + 1))
+        next_page = wave.stop
+        results = await asyncio.gather(*(fetch_page(http, key, page, stats, base_url) for page in wave))
+        pages += len(wave)
+
+        new_jobs = []
+        last_page = False
+        for page_results in results:
+            if page_results is None:
+                stats["failed_pages"] += 1
+                continue
+            if len(page_results) < results_per_page:
+                last_page = True
+            for job in page_results:
+                job_id = str(job.get("id") or "")
+                if not job_id:
+                    continue
+                if job_id in jobs:
+                    stats["duplicates"] += 1
+                    continue
+                jobs[job_id] = job
+                new_jobs.append(job)
+
+        wave_skills = count_skills(job.get("description", "") for job in new_jobs)
+        new_skills = len(wave_skills.keys() - skills.keys())
+        skills.update(wave_skills)
+
+        if last_page:
+            stop_reason = "last_page"
+            break
+        if not new_jobs:
+            stop_reason = "no_new_jobs" if stats["failed_pages"] < pages else "failed"
+            break
+        # الموجة الأولى دايماً كلها مهارات جديدة، نقيس من الثانية
+        if wave.start > 1 and new_skills / len(new_jobs) < min_new_skill_rate:
+            stop_reason = "saturated"
+            break
+
+    elapsed = time.perf_counter() - started
+    print(f"[Harvester] ✅ {len(jobs)} وظيفة من {pages} صفحة ({stop_reason}) خلال {elapsed:.2f}s")
+    return {
+        "jobs": list(jobs.values()),
+        "skills": skills,
+        "pages": pages,
+        "stop_reason": stop_reason,
+        "elapsed_s": round(elapsed, 3),
+        **stats,
+    }
+
+
+def harvest(country="us", keyword="", **kwargs):
+    """Sync entry point (CLI, background jobs); runs its own pooled client and event loop."""
+    async def run():
+        concurrency = kwargs.get("concurrency", HARVEST_CONCURRENCY)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(timeout=ADZUNA_TIMEOUT, limits=limits) as http:
+            return await harvest_async(country, keyword, http=http, **kwargs)
+
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Harvest several Adzuna pages and count skills")
+    parser.add_argument("keyword")
+    parser.add_argument("--country", default="us")
+    parser.add_argument("--pages", type=int, default=HARVEST_MAX_PAGES)
+    parser.add_argument("--per-page", type=int, default=HARVEST_RESULTS_PER_PAGE)
+    parser.add_argument("--concurrency", type=int, default=HARVEST_CONCURRENCY)
+    parser.add_argument("--min-new-skill-rate", type=float, default=HARVEST_MIN_NEW_SKILL_RATE)
+    parser.add_argument("--stub", action="store_true", help="run against a local adzuna_stub server")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub latency (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.1, help="stub 429 probability")
+    args = parser.parse_args()
+
+    base_url = BASE_URL
+    server = None
+    if args.stub:
+        from adzuna_stub import start_stub
+        server, stub_url = start_stub(latency=args.latency, error_rate=args.error_rate)
+        base_url = stub_url + "/jobs/{country}/search/{page}"
+
+    try:
+        result = harvest(
+            args.country, args.keyword,
+            max_pages=args.pages, results_per_page=args.per_page,
+            concurrency=args.concurrency, min_new_skill_rate=args.min_new_skill_rate,
+            base_url=base_url,
+        )
+    finally:
+        if server:
+            server.shutdown()
+
+    summary = {k: v for k, v in result.items() if k not in ("jobs", "skills")}
+    print(summary)
+    print("top skills:", [skill for skill, _ in result["skills"].most_common(15)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# adzuna_stub.py
+"""
+Local stand-in for the Adzuna search API, for exercising the client and
+the harvester without spending quota.
+
+Serves GET /v1/api/jobs/{country}/search/{page} with deterministic postings
+(stable ids, descriptions built from taxonomy skills with a long-tail
+distribution, neighbouring pages overlapping a little like the real API),
+adds random latency, and answers 429 with Retry-After either at random
+(--error-rate) or when its own request rate (--rate) is exceeded.
+
+    python adzuna_stub.py --port 8765 --latency 0.2 --error-rate 0.1
+    ADZUNA_BASE_URL=http://127.0.0.1:8765/v1/api uvicorn main:app
+"""
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from functools import lru_cache
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from skill_taxonomy import taxonomy
+
+PATH_RE = re.compile(r"^/v1/api/jobs/(?P<country>\w+)/search/(?P<page>\d+)$")
+FILLER_TEXT = "We are looking for a motivated teammate to join our growing team."
+
+
+class StubState:
+    def __init__(self, latency=0.2, error_rate=0.1, rate=0.0, total=1000, overlap=3, retry_after=0.2):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate = rate
+        self.total = total
+        self.overlap = overlap
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.recent = []
+        self.requests = 0
+        self.throttled = 0
+
+    def over_rate(self):
+        if not self.rate:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            self.recent = [t for t in self.recent if now - t < 1.0]
+            if len(self.recent) >= self.rate:
+                return True
+            self.recent.append(now)
+            return False
+
+
+@lru_cache(maxsize=64)
+def _skill_order(keyword):
+    return sorted(range(len(taxonomy)), key=lambda i: hashlib.md5(f"{keyword}:{i}".encode()).digest())
+
+
+def _posting(keyword, index):
+    digest = hashlib.sha256(f"{keyword}:{index}".encode()).digest()
+    rng = random.Random(digest)
+    # توزيع long-tail: أول المهارات تتكرر كثير والباقي نادر
+    order = _skill_order(keyword)
+    picks = {order[min(int(rng.paretovariate(1.2)) - 1, len(order) - 1)] for _ in range(6)}
+    skills = ", ".join(taxonomy.names[i] for i in sorted(picks))
+    return {
+        "id": str(int.from_bytes(digest[:6], "big")),
+        "title": f"{keyword.title()} #{index}",
+        "description": f"{FILLER_TEXT} Requirements: {skills}.",
+        "company": {"display_name": f"Company {index % 97}"},
+    }
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status, body, headers=()):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            match = PATH_RE.match(url.path)
+            if not match:
+                return self._json(404, {"error": "not found"})
+
+            with state.lock:
+                state.requests += 1
+            time.sleep(random.uniform(state.latency * 0.5, state.latency * 1.5))
+            if state.over_rate() or random.random() < state.error_rate:
+                with state.lock:
+                    state.throttled += 1
+                return self._json(429, {"error": "rate limited"}, [("Retry-After", str(state.retry_after))])
+
+            query = parse_qs(url.query)
+            keyword = " ".join(query.get("what", [""])[0].lower().split())
+            per_page = int(query.get("results_per_page", ["10"])[0])
+            page = int(match["page"])
+            # الصفحات تتداخل شوي (زي Adzuna لما تنضاف وظائف جديدة)
+            start = max((page - 1) * per_page - state.overlap, 0)
+            stop = min(start + per_page, state.total)
+            results = [_posting(keyword, i) for i in range(start, stop)]
+            self._json(200, {"count": state.total, "results": results})
+
+    return Handler
+
+
+def start_stub(host="127.0.0.1", port=0, **kwargs):
+    """Starts the stub in a daemon thread; returns (server, base_url). Stop with server.shutdown()."""
+    state = StubState(**kwargs)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1/api"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Adzuna API stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--rate", type=float, default=0.0, help="max requests/second before 429 (0 = off)")
+    parser.add_argument("--total", type=int, default=1000, help="postings per keyword")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(StubState(
+        latency=args.latency, error_rate=args.error_rate, rate=args.rate, total=args.total,
+    )))
+    print(f"[Adzuna stub] listening on http://{args.host}:{args.port}/v1/api")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
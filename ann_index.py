@@ -0,0 +1,340 @@
+# ann_index.py
+"""
+Inverted-file (IVF) approximate nearest-neighbour index for course
+embeddings, pure NumPy. Vectors are clustered with spherical k-means into
+`nlist` lists; a query only scores the `nprobe` lists whose centroids are
+closest, so raising nprobe trades latency for recall.
+
+    python ann_index.py build --store course_embeddings.bin --out ann_index --nlist 1024
+    python ann_index.py sync --out ann_index             # apply courses added/changed since the last sync
+    python ann_index.py bench --store course_embeddings.bin --out ann_index --nprobe 1,4,16,64
+    python ann_index.py bench --synthetic 1000000 --nlist 2048   # no store needed
+"""
+import os
+import json
+import time
+import argparse
+import numpy as np
+from embedding_search import (
+    EmbeddingIndex, normalize_rows, popularity_boost, SIMILARITY_WEIGHT,
+)
+
+ANN_INDEX_PATH = os.getenv("ANN_INDEX_PATH", "ann_index")
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+# نرجع شوي لورا عن الـ watermark عشان transactions طويلة commit بعده بـ updated_at أقدم
+ANN_SYNC_OVERLAP_SECONDS = float(os.getenv("ANN_SYNC_OVERLAP_SECONDS", "300"))
+
+ASSIGN_CHUNK_ROWS = 8192
+
+
+def _assign(vectors, centroids):
+    """Nearest centroid (by cosine) for every row, computed in chunks."""
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_ROWS):
+        block = np.asarray(vectors[start:start + ASSIGN_CHUNK_ROWS], dtype=np.float32)
+        labels[start:start + ASSIGN_CHUNK_ROWS] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def train_centroids(vectors, nlist, iters=20, sample_size=None, seed=0):
+    """Spherical k-means on a sample of the (normalized) vectors."""
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    sample_size = min(n, sample_size or nlist * 64)
+    sample = np.asarray(vectors[np.sort(rng.choice(n, sample_size, replace=False))], dtype=np.float32)
+
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+    for _ in range(iters):
+        labels = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = counts == 0
+        # القوائم الفاضية تاخذ نقاط عشوائية جديدة
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    """IVF index with per-list arrays, incremental add and npy persistence."""
+
+    def __init__(self, centroids, nprobe=ANN_NPROBE):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.nprobe = nprobe
+        # courses.updated_at (epoch seconds) اللي الفهرس متزامن معه لحد الآن
+        self.synced_at = None
+        nlist = len(self.centroids)
+        self.list_ids = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+        self.list_vectors = [np.empty((0, self.dim), dtype=np.float32) for _ in range(nlist)]
+        self.list_boost = [np.empty(0, dtype=np.float32) for _ in range(nlist)]
+
+    @property
+    def dim(self):
+        return self.centroids.shape[1]
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    def __len__(self):
+        return sum(len(ids) for ids in self.list_ids)
+
+    @classmethod
+    def build(cls, ids, vectors, boost, nlist=1024, nprobe=ANN_NPROBE, iters=20, seed=0):
+        nlist = min(nlist, len(ids))
+        index = cls(train_centroids(vectors, nlist, iters=iters, seed=seed), nprobe)
+        index.add(ids, vectors, boost, normalized=True)
+        return index
+
+    def add(self, ids, vectors, boost, normalized=False):
+        """Insert new courses into their nearest lists (no retraining)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not normalized:
+            vectors = normalize_rows(vectors)
+        boost = np.asarray(boost, dtype=np.float32)
+
+        labels = _assign(vectors, self.centroids)
+        order = np.argsort(labels, kind="stable")
+        bounds = np.flatnonzero(np.diff(labels[order])) + 1
+        for group in np.split(order, bounds):
+            if not len(group):
+                continue
+            lst = int(labels[group[0]])
+            self.list_ids[lst] = np.concatenate([self.list_ids[lst], ids[group]])
+            self.list_vectors[lst] = np.concatenate([self.list_vectors[lst], vectors[group]])
+            self.list_boost[lst] = np.concatenate([self.list_boost[lst], boost[group]])
+        return len(ids)
+
+    def remove(self, ids):
+        """Drop courses by id; only the lists that contain one are copied."""
+        ids = np.asarray(ids, dtype=np.int64)
+        removed = 0
+        for lst, list_ids in enumerate(self.list_ids):
+            if not len(list_ids):
+                continue
+            keep = ~np.isin(list_ids, ids)
+            if keep.all():
+                continue
+            removed += int(len(keep) - keep.sum())
+            self.list_ids[lst] = list_ids[keep]
+            self.list_vectors[lst] = self.list_vectors[lst][keep]
+            self.list_boost[lst] = self.list_boost[lst][keep]
+        return removed
+
+    def search_batch(self, query_vectors, k=20, nprobe=None):
+        """Same contract as EmbeddingIndex.search_batch: (ids, scores), best first."""
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        queries = normalize_rows(np.atleast_2d(query_vectors))
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+
+        out_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        out_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for row, (query, probe) in enumerate(zip(queries, probes)):
+            ids = np.concatenate([self.list_ids[p] for p in probe])
+            if not len(ids):
+                continue
+            scores = np.concatenate([
+                self.list_vectors[p] @ query * SIMILARITY_WEIGHT + self.list_boost[p] for p in probe
+            ])
+            kk = min(k, len(scores))
+            top = np.argpartition(-scores, kk - 1)[:kk]
+            top = top[np.argsort(-scores[top])]
+            out_ids[row, :kk] = ids[top]
+            out_scores[row, :kk] = scores[top]
+        return out_ids, out_scores
+
+    def search(self, query_vector, k=20, nprobe=None):
+        ids, scores = self.search_batch(query_vector, k, nprobe)
+        return ids[0], scores[0]
+
+    # ---------- persistence ----------
+    def save(self, path=ANN_INDEX_PATH):
+        """
+        Write a new versioned directory of .npy files next to `path`, then
+        point the `path` symlink at it with one os.replace, so readers see
+        either the old index or the new one, never a half-swapped state.
+        """
+        version_dir = f"{path}.v{time.time_ns()}"
+        tmp = f"{version_dir}.tmp"
+        os.makedirs(tmp)
+        offsets = np.cumsum([0] + [len(ids) for ids in self.list_ids])
+        np.save(os.path.join(tmp, "centroids.npy"), self.centroids)
+        np.save(os.path.join(tmp, "offsets.npy"), offsets)
+        np.save(os.path.join(tmp, "ids.npy"), np.concatenate(self.list_ids))
+        np.save(os.path.join(tmp, "vectors.npy"), np.concatenate(self.list_vectors))
+        np.save(os.path.join(tmp, "boost.npy"), np.concatenate(self.list_boost))
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({
+                "nlist": self.nlist, "dim": self.dim, "count": len(self), "nprobe": self.nprobe,
+                "synced_at": self.synced_at,
+            }, f)
+        os.rename(tmp, version_dir)
+
+        # فهرس قديم كمجلد حقيقي (قبل الـ symlink): ننقله جانباً مرة وحدة
+        if os.path.isdir(path) and not os.path.islink(path):
+            os.replace(path, f"{path}.v0")
+        link = f"{path}.link-{os.getpid()}"
+        os.symlink(os.path.basename(version_dir), link)
+        os.replace(link, path)
+        _remove_old_versions(path, keep=version_dir)
+
+    @classmethod
+    def load(cls, path=ANN_INDEX_PATH, nprobe=None):
+        """Load a saved index; list arrays are read-only views over mmapped files."""
+        # نثبت المجلد الحقيقي أول، عشان save متزامن ما يخلط ملفات نسختين
+        path = os.path.realpath(path)
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        index = cls(np.load(os.path.join(path, "centroids.npy")), nprobe or ANN_NPROBE)
+        offsets = np.load(os.path.join(path, "offsets.npy"))
+        ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        boost = np.load(os.path.join(path, "boost.npy"), mmap_mode="r")
+        bounds = offsets[1:-1]
+        index.list_ids = np.split(ids, bounds)
+        index.list_vectors = np.split(vectors, bounds)
+        index.list_boost = np.split(boost, bounds)
+        index.synced_at = meta.get("synced_at")
+        print(f"[ANN] ✅ loaded {meta['count']} vectors in {meta['nlist']} lists from {path}")
+        return index
+
+
+def _remove_old_versions(path, keep, keep_previous=1):
+    """Delete superseded version directories, keeping the newest few for readers mid-load."""
+    prefix = os.path.basename(path) + ".v"
+    parent = os.path.dirname(os.path.abspath(path))
+    versions = sorted(
+        (name for name in os.listdir(parent)
+         if name.startswith(prefix) and name[len(prefix):].isdigit() and name != os.path.basename(keep)),
+        key=lambda name: int(name[len(prefix):]),
+    )
+    for name in versions[:max(len(versions) - keep_previous, 0)]:
+        old = os.path.join(parent, name)
+        for file_name in os.listdir(old):
+            os.remove(os.path.join(old, file_name))
+        os.rmdir(old)
+
+
+# -------------------------------------------
+# 🔹 Benchmark: recall@k مقابل الزمن
+# -------------------------------------------
+def benchmark(exact: EmbeddingIndex, ann: IVFIndex, nprobes, k=20, queries=200, seed=0):
+    ids, matrix, _ = exact._data
+    rng = np.random.default_rng(seed)
+    # استعلامات قريبة من كورسات حقيقية مع شوية ضجيج
+    picks = rng.choice(len(ids), min(queries, len(ids)), replace=False)
+    query_vectors = np.asarray(matrix[np.sort(picks)], dtype=np.float32)
+    query_vectors += rng.normal(0, 0.3 / np.sqrt(matrix.shape[1]), query_vectors.shape).astype(np.float32)
+
+    start = time.perf_counter()
+    truth, _ = exact.search_batch(query_vectors, k, batch_size=1)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(query_vectors)
+
+    rows = [{"nprobe": "exact", "recall": 1.0, "ms_per_query": round(exact_ms, 3)}]
+    for nprobe in nprobes:
+        start = time.perf_counter()
+        found, _ = ann.search_batch(query_vectors, k, nprobe=nprobe)
+        ms = (time.perf_counter() - start) * 1000 / len(query_vectors)
+        hits = sum(len(set(f) & set(t)) for f, t in zip(found.tolist(), truth.tolist()))
+        rows.append({"nprobe": nprobe, "recall": round(hits / truth.size, 4), "ms_per_query": round(ms, 3)})
+    return rows
+
+
+def synthetic_catalog(rows, dim=256, topics=2000, seed=0):
+    """Clustered random vectors (courses bunch around topics like real embeddings)."""
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(rng.normal(size=(topics, dim)))
+    noise = 1.0 / np.sqrt(dim)  # ضجيج بطول ~1 حول مركز الـ topic
+    vectors = np.empty((rows, dim), dtype=np.float32)
+    for start in range(0, rows, ASSIGN_CHUNK_ROWS):
+        end = min(start + ASSIGN_CHUNK_ROWS, rows)
+        picks = rng.integers(0, topics, end - start)
+        vectors[start:end] = centers[picks] + rng.normal(0, noise, (end - start, dim))
+    boost = popularity_boost(rng.uniform(3, 5, rows), rng.integers(0, 50000, rows))
+    return np.arange(1, rows + 1, dtype=np.int64), normalize_rows(vectors), boost
+
+
+def sync_from_db(path=ANN_INDEX_PATH, batch_size=2000):
+    """
+    Apply courses whose updated_at moved past the index watermark: new
+    courses are inserted, re-embedded or re-rated ones are deleted and
+    re-inserted (boost included), and un-embedded ones are dropped.
+    """
+    from sqlalchemy import text
+    from database import engine
+
+    # القوائم mmap للقراءة فقط، و add/remove ينسخوا القوائم اللي تتغير بس
+    index = IVFIndex.load(path)
+    since = (index.synced_at or 0) - ANN_SYNC_OVERLAP_SECONDS
+    added = removed = 0
+    with engine.connect() as conn:
+        # وقت الـ DB نفسه كـ watermark جديد (مش ساعة هالجهاز)
+        synced_at = conn.execute(text("SELECT extract(epoch FROM now())")).scalar()
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(text("""
+            SELECT id, rating, num_reviews, embedding::text
+            FROM courses
+            WHERE updated_at > to_timestamp(:since)
+            ORDER BY id
+        """), {"since": since})
+        for batch in result.partitions(batch_size):
+            removed += index.remove([row[0] for row in batch])
+            batch = [row for row in batch if row[3] is not None]
+            if not batch:
+                continue
+            added += index.add(
+                [row[0] for row in batch],
+                np.array([json.loads(row[3]) for row in batch], dtype=np.float32),
+                popularity_boost([row[1] or 0 for row in batch], [row[2] or 0 for row in batch]),
+            )
+    index.synced_at = float(synced_at)
+    index.save(path)
+    print(f"[ANN] ✅ synced: {added} indexed, {removed} replaced or dropped")
+    return added, removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IVF index for course embeddings")
+    parser.add_argument("command", choices=["build", "sync", "add-new", "bench"])
+    parser.add_argument("--store", default=None, help="embedding store built by embedding_store.py")
+    parser.add_argument("--out", default=ANN_INDEX_PATH)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--iters", type=int, default=20)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", default="1,4,8,16,32,64")
+    parser.add_argument("--synthetic", type=int, default=0, help="bench on N generated vectors instead of a store")
+    parser.add_argument("--dim", type=int, default=256)
+    args = parser.parse_args()
+
+    if args.command in ("sync", "add-new"):
+        sync_from_db(args.out)
+    elif args.command == "bench" and args.synthetic:
+        store_ids, store_matrix, store_boost = synthetic_catalog(args.synthetic, args.dim)
+        exact = EmbeddingIndex()
+        exact._data = (store_ids, store_matrix, store_boost)
+        start = time.time()
+        ann = IVFIndex.build(store_ids, store_matrix, store_boost, nlist=args.nlist, iters=args.iters)
+        print(f"[ANN] built {len(ann)} vectors / {ann.nlist} lists in {time.time() - start:.1f}s")
+        print(f"{'nprobe':>7} {'recall@' + str(args.k):>10} {'ms/query':>9}")
+        for r in benchmark(exact, ann, [int(p) for p in args.nprobe.split(",")], args.k, args.queries):
+            print(f"{r['nprobe']:>7} {r['recall']:>10} {r['ms_per_query']:>9}")
+    else:
+        from embedding_store import EMBEDDING_STORE_PATH, open_store, snapshot_time
+        store_ids, store_matrix, store_boost = open_store(args.store or EMBEDDING_STORE_PATH)
+
+        if args.command == "build":
+            start = time.time()
+            ann = IVFIndex.build(store_ids, store_matrix, store_boost, nlist=args.nlist, iters=args.iters)
+            # الـ sync يكمل من وقت الـ DB اللي انقرأ فيه الـ store (بدونه: sync كامل أول مرة)
+            ann.synced_at = snapshot_time(args.store or EMBEDDING_STORE_PATH)
+            ann.save(args.out)
+            print(f"[ANN] ✅ built {len(ann)} vectors / {ann.nlist} lists in {time.time() - start:.1f}s")
+        else:
+            exact = EmbeddingIndex()
+            exact._data = (store_ids, store_matrix, store_boost)
+            ann = IVFIndex.load(args.out)
+            print(f"{'nprobe':>7} {'recall@' + str(args.k):>10} {'ms/query':>9}")
+            for r in benchmark(exact, ann, [int(p) for p in args.nprobe.split(",")], args.k, args.queries):
+                print(f"{r['nprobe']:>7} {r['recall']:>10} {r['ms_per_query']:>9}")
@@ -0,0 +1,161 @@
+# bench_search.py
+"""
+Latency / hit-rate benchmark for the course search modes on a generated
+catalog. Runs against DATABASE_URL inside a scratch schema that is dropped
+at the end (pass --keep to reuse it on the next run).
+
+    python bench_search.py --rows 200000 --queries 300
+"""
+import time
+import random
+import argparse
+import statistics
+from sqlalchemy import text
+from database import make_engine
+from courses_fetcher import QUERY_BUILDERS, SET_TRGM_THRESHOLD, COURSE_TRGM_THRESHOLD
+
+SCHEMA = "search_bench"
+
+TOPICS = [
+    "Machine Learning", "Data Science", "JavaScript", "Python", "React",
+    "Deep Learning", "SQL", "Web Development", "Cloud Computing", "Docker",
+    "Kubernetes", "Cyber Security", "Excel", "Power BI", "Flutter",
+    "Node.js", "Django", "Data Analysis", "UX Design", "Project Management",
+]
+PREFIXES = ["Complete", "The Ultimate", "Practical", "Modern", "Hands-On", "Intro to", "Mastering", ""]
+SUFFIXES = ["Bootcamp", "for Beginners", "A-Z", "Masterclass", "Crash Course", "in 30 Days", "Projects", ""]
+FILLER = ["Guide", "Essentials", "Fundamentals", "Workshop", "Academy", "Zero to Hero", "2024", "Advanced"]
+
+
+def generate_titles(rows, rng):
+    titles = []
+    for _ in range(rows):
+        # جزء من الكتالوج عناوين عامة ما تطابق أي topic
+        if rng.random() < 0.3:
+            titles.append(" ".join(rng.sample(FILLER, 3)))
+            continue
+        parts = [rng.choice(PREFIXES), rng.choice(TOPICS), rng.choice(SUFFIXES)]
+        titles.append(" ".join(p for p in parts if p))
+    return titles
+
+
+def make_typo(word, rng):
+    """Drop, swap or hyphenate one character: "Machin Learning", "Data-Science"."""
+    if " " in word and rng.random() < 0.3:
+        return word.replace(" ", "-", 1)
+    chars = list(word)
+    i = rng.randrange(1, len(chars) - 1) if len(chars) > 2 else 0
+    if rng.random() < 0.5:
+        del chars[i]
+    else:
+        chars[i], chars[i - 1] = chars[i - 1], chars[i]
+    return "".join(chars)
+
+
+def generate_queries(count, rng):
+    queries = []
+    for _ in range(count):
+        topic = rng.choice(TOPICS)
+        query = make_typo(topic, rng) if rng.random() < 0.5 else topic
+        queries.append((topic, query))
+    return queries
+
+
+def setup(engine, rows, seed):
+    rng = random.Random(seed)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        conn.execute(text(f"""
+            CREATE TABLE {SCHEMA}.courses (
+                id SERIAL PRIMARY KEY,
+                title VARCHAR NOT NULL,
+                url VARCHAR NOT NULL,
+                rating FLOAT,
+                num_reviews INTEGER,
+                num_published_lectures INTEGER,
+                created DATE,
+                last_update_date DATE,
+                duration VARCHAR,
+                instructors_id VARCHAR,
+                image VARCHAR,
+                title_tsv tsvector GENERATED ALWAYS AS (to_tsvector('english', coalesce(title, ''))) STORED
+            )
+        """))
+
+    titles = generate_titles(rows, rng)
+    insert = text(f"""
+        INSERT INTO {SCHEMA}.courses (title, url, rating, num_reviews)
+        VALUES (:title, :url, :rating, :num_reviews)
+    """)
+    with engine.begin() as conn:
+        for start in range(0, rows, 5000):
+            conn.execute(insert, [
+                {"title": t, "url": f"https://example.com/c/{start + i}",
+                 "rating": round(rng.uniform(3, 5), 1), "num_reviews": rng.randint(0, 50000)}
+                for i, t in enumerate(titles[start:start + 5000])
+            ])
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"CREATE INDEX ON {SCHEMA}.courses USING gin (title_tsv)"))
+        conn.execute(text(f"CREATE INDEX ON {SCHEMA}.courses USING gin (title gin_trgm_ops)"))
+        conn.execute(text(f"ANALYZE {SCHEMA}.courses"))
+
+
+def run_mode(engine, mode, queries, limit, threshold):
+    latencies, hits = [], 0
+    with engine.connect() as conn:
+        for topic, query in queries:
+            sql, params = QUERY_BUILDERS[mode]([query], limit)
+            start = time.perf_counter()
+            if mode == "trgm":
+                conn.execute(SET_TRGM_THRESHOLD, {"threshold": str(threshold)})
+            rows = conn.execute(sql, params).fetchall()
+            latencies.append((time.perf_counter() - start) * 1000)
+            if any(topic.lower() in row.title.lower() for row in rows):
+                hits += 1
+            conn.rollback()
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        "hit_rate": round(hits / len(queries), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--limit", type=int, default=30)
+    parser.add_argument("--threshold", type=float, default=COURSE_TRGM_THRESHOLD)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="keep (and reuse) the scratch schema")
+    args = parser.parse_args()
+
+    engine = make_engine(name="bench", connect_args={"options": f"-csearch_path={SCHEMA},public"})
+    with engine.connect() as conn:
+        exists = conn.execute(text(
+            "SELECT 1 FROM information_schema.tables WHERE table_schema = :s AND table_name = 'courses'"
+        ), {"s": SCHEMA}).first()
+    if not (args.keep and exists):
+        print(f"[bench] generating {args.rows} courses in schema {SCHEMA} ...")
+        setup(engine, args.rows, args.seed)
+
+    queries = generate_queries(args.queries, random.Random(args.seed + 1))
+    print(f"{'mode':<6} {'p50 ms':>8} {'p95 ms':>8} {'hit rate':>9}")
+    try:
+        for mode in QUERY_BUILDERS:
+            r = run_mode(engine, mode, queries, args.limit, args.threshold)
+            print(f"{r['mode']:<6} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['hit_rate']:>9}")
+    finally:
+        if not args.keep:
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
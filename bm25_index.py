@@ -0,0 +1,166 @@
+# bm25_index.py
+import re
+import sys
+import math
+import time
+from array import array
+import numpy as np
+from sqlalchemy import text
+from database import engine
+
+COURSE_FIELDS = (
+    "id", "title", "url", "rating", "num_reviews", "num_published_lectures",
+    "created", "last_update_date", "duration", "instructors_id", "image",
+)
+
+# نحتفظ بـ + و # عشان C++ و C#
+TOKEN_RE = re.compile(r"[\w+#]+")
+
+
+def tokenize(value: str):
+    return TOKEN_RE.findall((value or "").lower())
+
+
+class _IndexData:
+    """
+    Immutable snapshot of the index. Postings are NumPy-backed: for term id t,
+    `doc_ids[t]` holds the matching doc numbers (int32) and `impacts[t]` the
+    precomputed BM25 weight of t in each doc (float32), sorted by weight
+    descending.
+    """
+
+    __slots__ = ("term_ids", "doc_ids", "impacts", "docs")
+
+    def __init__(self, term_ids, doc_ids, impacts, docs):
+        self.term_ids = term_ids
+        self.doc_ids = doc_ids
+        self.impacts = impacts
+        self.docs = docs
+
+
+class BM25Index:
+    """In-memory BM25 index over course titles."""
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._data = None
+        self.built_at = None
+
+    @property
+    def ready(self):
+        return self._data is not None
+
+    def __len__(self):
+        return len(self._data.docs) if self._data else 0
+
+    def build(self, rows):
+        """Index an iterable of course rows (tuples in COURSE_FIELDS order)."""
+        term_ids = {}
+        postings = []  # term id -> list of (doc, tf)
+        doc_lens = array("H")
+        docs = []
+
+        for row in rows:
+            doc = len(docs)
+            docs.append(tuple(row))
+            tokens = tokenize(row[1])
+            doc_lens.append(min(len(tokens), 0xFFFF))
+
+            counts = {}
+            for token in tokens:
+                tid = term_ids.get(token)
+                if tid is None:
+                    tid = term_ids[sys.intern(token)] = len(term_ids)
+                    postings.append([])
+                counts[tid] = counts.get(tid, 0) + 1
+            for tid, tf in counts.items():
+                postings[tid].append((doc, tf))
+
+        n_docs = len(docs)
+        avgdl = (sum(doc_lens) / n_docs) if n_docs else 0.0
+        k1, b = self.k1, self.b
+
+        doc_ids, impacts = [], []
+        for plist in postings:
+            df = len(plist)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            weighted = []
+            for doc, tf in plist:
+                norm = k1 * (1 - b + b * doc_lens[doc] / avgdl) if avgdl else k1
+                weighted.append((idf * tf * (k1 + 1) / (tf + norm), doc))
+            weighted.sort(reverse=True)
+            doc_ids.append(np.fromiter((doc for _, doc in weighted), np.int32, len(weighted)))
+            impacts.append(np.fromiter((w for w, _ in weighted), np.float32, len(weighted)))
+
+        # استبدال ذري: الطلبات الجارية تكمل على النسخة القديمة
+        self._data = _IndexData(term_ids, doc_ids, impacts, docs)
+        self.built_at = time.time()
+        return n_docs
+
+    def build_from_db(self, batch_size=5000):
+        sql = text(f"SELECT {', '.join(COURSE_FIELDS)} FROM courses")
+        start = time.time()
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(sql)
+            count = self.build(tuple(row) for row in result)
+        print(f"[BM25] ✅ indexed {count} courses in {time.time() - start:.1f}s")
+        return count
+
+    def search(self, keywords: list, limit=20):
+        """Same contract as courses_fetcher.search_courses: list of course dicts."""
+        data = self._data
+        if data is None or not keywords:
+            return []
+
+        query_terms = set()
+        for keyword in keywords:
+            for token in tokenize(keyword):
+                tid = data.term_ids.get(token)
+                if tid is not None:
+                    query_terms.add(tid)
+        if not query_terms:
+            return []
+
+        if len(query_terms) == 1:
+            # postings مرتبة حسب الوزن، فأول limit هم الأفضل
+            (tid,) = query_terms
+            top = data.doc_ids[tid][:limit]
+        else:
+            # نجمع الأوزان بـ bincount بدل dict بايثون: الحلقة كلها بـ C
+            terms = sorted(query_terms)
+            postings = np.concatenate([data.doc_ids[tid] for tid in terms])
+            scores = np.bincount(postings, weights=np.concatenate([data.impacts[tid] for tid in terms]))
+            # المرشحين هم الـ postings نفسها (مش كل الكتالوج)؛ الـ doc يتكرر
+            # مرة لكل term على الأكثر، فأعلى limit * terms فيهم limit docs مختلفة
+            candidate_scores = scores[postings]
+            keep = limit * len(terms)
+            if len(postings) > keep:
+                best = np.argpartition(candidate_scores, -keep)[-keep:]
+                postings = postings[best]
+            candidates = np.unique(postings)
+            # أعلى score أولاً، والتعادل حسب رقم الـ doc عشان النتيجة ثابتة
+            top = candidates[np.lexsort((candidates, -scores[candidates]))][:limit].tolist()
+
+        docs = data.docs
+        return [dict(zip(COURSE_FIELDS, docs[doc])) for doc in top]
+
+    def stats(self) -> dict:
+        data = self._data
+        if data is None:
+            return {"ready": False}
+        return {
+            "ready": True,
+            "docs": len(data.docs),
+            "terms": len(data.term_ids),
+            "postings": sum(len(p) for p in data.doc_ids),
+            "built_at": self.built_at,
+        }
+
+
+course_index = BM25Index()
+
+
+def search_courses_bm25(keywords: list, limit=20):
+    """Drop-in replacement for search_courses served from the in-memory index."""
+    return course_index.search(keywords, limit)
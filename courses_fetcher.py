@@ -1,83 +1,244 @@
 # courses_fetcher.py
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 import os
+import asyncio
+from functools import lru_cache
 from dotenv import load_dotenv
+from database import engine, async_engine
+from bm25_index import course_index
+from search_cache import course_cache, make_key as search_cache_key
+from embedding_search import course_embeddings, get_embedding, get_embedding_async, profile_text
 
 load_dotenv()
 
-DATABASE_URL = os.getenv('DATABASE_URL')
-engine = create_engine(DATABASE_URL, future=True)
+# ilike: substring match (default) | fts: full-text search ranked by ts_rank
+# trgm: typo-tolerant pg_trgm word similarity | bm25: in-process index (bm25_index.py)
+# (semantic search takes the whole profile: search_courses_with_embeddings, SEMANTIC_SEARCH=1 in main.py)
+COURSE_SEARCH_MODE = os.getenv("COURSE_SEARCH_MODE", "ilike")
+COURSE_TRGM_THRESHOLD = float(os.getenv("COURSE_TRGM_THRESHOLD", "0.5"))
+
+COURSE_COLUMNS = """id, title, url, rating, num_reviews, num_published_lectures,
+               created, last_update_date, duration, instructors_id, image"""
 
-def search_courses(keywords: list, limit=20):
-    """Search courses by keywords (matches title). Returns list of dicts."""
-    if not keywords:
-        return []
-    patterns = [f"%{k}%" for k in keywords if k.strip()]
 
+def _clean_keywords(keywords: list):
+    return [k.strip() for k in keywords if k and k.strip()]
+
+
+# الـ SQL يعتمد بس على عدد الكلمات، فنبني كل شكل مرة وحدة ونعيد استخدامه
+# (SQLAlchemy يخزن الـ compiled statement وasyncpg الـ prepared statement لنفس النص)
+@lru_cache(maxsize=64)
+def _ilike_sql(n: int):
     # build simple OR query for title only (لان description و platform مش موجودين)
-    clauses = []
-    params = {}
-    for i, p in enumerate(patterns):
-        clauses.append(f"title ILIKE :p{i}")
-        params[f"p{i}"] = p
+    where_clause = " OR ".join(f"title ILIKE :p{i}" for i in range(n))
+    return text(f"""
+        SELECT {COURSE_COLUMNS}
+        FROM courses
+        WHERE {where_clause}
+        LIMIT :limit
+    """)
 
-    where_clause = " OR ".join(clauses)
-    sql = text(f"""
-        SELECT id, title, url, rating, num_reviews, num_published_lectures,
-               created, last_update_date, duration, instructors_id, image
+
+@lru_cache(maxsize=64)
+def _fts_sql(n: int):
+    tsquery = " || ".join(f"plainto_tsquery('english', :k{i})" for i in range(n))
+    return text(f"""
+        SELECT {COURSE_COLUMNS}
+        FROM courses, (SELECT {tsquery}) AS q(query)
+        WHERE title_tsv @@ q.query
+        ORDER BY ts_rank(title_tsv, q.query) DESC
+        LIMIT :limit
+    """)
+
+
+@lru_cache(maxsize=64)
+def _trgm_sql(n: int):
+    where_clause = " OR ".join(f":k{i} <% title" for i in range(n))
+    if n == 1:
+        score = "word_similarity(:k0, title)"
+    else:
+        score = "GREATEST(" + ", ".join(f"word_similarity(:k{i}, title)" for i in range(n)) + ")"
+    return text(f"""
+        SELECT {COURSE_COLUMNS}
         FROM courses
         WHERE {where_clause}
+        ORDER BY {score} DESC
         LIMIT :limit
     """)
+
+
+def _build_ilike_query(keywords: list, limit: int):
+    """Build the title ILIKE query shared by the sync and async search."""
+    patterns = [f"%{k}%" for k in _clean_keywords(keywords)]
+    if not patterns:
+        return None, None
+
+    params = {f"p{i}": p for i, p in enumerate(patterns)}
+    params['limit'] = limit
+    return _ilike_sql(len(patterns)), params
+
+
+def _build_fts_query(keywords: list, limit: int):
+    """
+    Full-text query over the generated `title_tsv` column (GIN indexed, see
+    db_bootstrap.py). Keywords are OR-ed and results ordered by ts_rank.
+    """
+    words = _clean_keywords(keywords)
+    if not words:
+        return None, None
+
+    params = {f"k{i}": w for i, w in enumerate(words)}
     params['limit'] = limit
+    return _fts_sql(len(words)), params
+
+
+def _build_trgm_query(keywords: list, limit: int):
+    """
+    Fuzzy query using pg_trgm word similarity (`<%`), so "Machin Learning"
+    still matches "Machine Learning A-Z". Uses the gin_trgm_ops index on
+    title; the threshold is set per transaction, see SET_TRGM_THRESHOLD.
+    """
+    words = _clean_keywords(keywords)
+    if not words:
+        return None, None
+
+    params = {f"k{i}": w for i, w in enumerate(words)}
+    params['limit'] = limit
+    return _trgm_sql(len(words)), params
+
+
+SET_TRGM_THRESHOLD = text(
+    "SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"
+)
+
+QUERY_BUILDERS = {
+    "ilike": _build_ilike_query,
+    "fts": _build_fts_query,
+    "trgm": _build_trgm_query,
+}
+
+
+def _resolve_mode(mode):
+    mode = mode or COURSE_SEARCH_MODE
+    if mode not in QUERY_BUILDERS and mode != "bm25":
+        raise ValueError(f"Unknown course search mode: {mode}")
+    return mode
+
+
+def _trgm_params(trgm_threshold):
+    threshold = COURSE_TRGM_THRESHOLD if trgm_threshold is None else trgm_threshold
+    return {"threshold": str(threshold)}
+
+
+def _cache_key(keywords, limit, mode, trgm_threshold):
+    # العتبة تغير نتائج trgm بس
+    extra = _trgm_params(trgm_threshold)["threshold"] if mode == "trgm" else None
+    return search_cache_key(keywords, limit, mode, extra)
+
+
+def search_courses(keywords: list, limit=20, mode=None, trgm_threshold=None):
+    """Search courses by keywords (matches title). Returns list of dicts."""
+    if not keywords:
+        return []
+    mode = _resolve_mode(mode)
+    if mode == "bm25":
+        if course_index.ready:
+            return course_index.search(keywords, limit)
+        mode = "ilike"  # الفهرس لسا ما انبنى
+    sql, params = QUERY_BUILDERS[mode](keywords, limit)
+    if sql is None:
+        return []
+
+    course_cache.check_version(engine)
+    key = _cache_key(keywords, limit, mode, trgm_threshold)
+    cached = course_cache.get(key)
+    if cached is not None:
+        return cached
+    # النسخة قبل الاستعلام: لو تغير الكتالوج أثناءه ما نخزن النتيجة
+    version = course_cache.version
 
     with engine.connect() as conn:
+        if mode == "trgm":
+            conn.execute(SET_TRGM_THRESHOLD, _trgm_params(trgm_threshold))
         res = conn.execute(sql, params).fetchall()
-    return [dict(row._mapping) for row in res]
-
-# import openai
-# import numpy as np
-# from database import get_supabase_client
-
-# def cosine_similarity(vec1, vec2):
-#     return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
-
-# def get_embedding(text):
-#     response = openai.embeddings.create(
-#         model="text-embedding-3-small",
-#         input=text
-#     )
-#     return response.data[0].embedding
-
-# def search_courses_with_embeddings(user_profile, limit=20):
-#     client = get_supabase_client()
-
-#     # ولد embedding للمستخدم
-#     profile_text = " ".join(user_profile.get("skills", []) +
-#                             user_profile.get("interests", []) +
-#                             [user_profile.get("specialization", "")] +
-#                             [user_profile.get("career_goal", "")])
-#     user_emb = np.array(get_embedding(profile_text))
-
-#     # استرجع الكورسات + embeddings
-#     data = client.table("courses").select("id, title, url, rating, num_reviews, duration, image, embedding").limit(200).execute()
-#     courses = data.data or []
-
-#     scored_courses = []
-#     for c in courses:
-#         course_emb = np.array(c.get("embedding"))
-#         if course_emb is None:
-#             continue
-
-#         similarity = cosine_similarity(user_emb, course_emb)
-
-#         # أضف وزن إضافي
-#         rating = c.get("rating") or 0
-#         reviews = c.get("num_reviews") or 0
-#         score = similarity * 10 + rating * 0.5 + min(reviews / 1000, 5)
-
-#         c["match_score"] = round(score, 3)
-#         scored_courses.append(c)
-
-#     scored_courses.sort(key=lambda x: x["match_score"], reverse=True)
-#     return scored_courses[:limit]
+    courses = [dict(row._mapping) for row in res]
+    course_cache.set(key, courses, version)
+    return courses
+
+
+async def search_courses_async(keywords: list, limit=20, mode=None, trgm_threshold=None):
+    """Async version of search_courses (used by the FastAPI routes)."""
+    if not keywords:
+        return []
+    mode = _resolve_mode(mode)
+    if mode == "bm25":
+        if course_index.ready:
+            return course_index.search(keywords, limit)
+        mode = "ilike"  # الفهرس لسا ما انبنى
+    sql, params = QUERY_BUILDERS[mode](keywords, limit)
+    if sql is None:
+        return []
+
+    await course_cache.check_version_async(async_engine)
+    key = _cache_key(keywords, limit, mode, trgm_threshold)
+    cached = course_cache.get(key)
+    if cached is not None:
+        return cached
+    # النسخة قبل الاستعلام: لو تغير الكتالوج أثناءه ما نخزن النتيجة
+    version = course_cache.version
+
+    async with async_engine.connect() as conn:
+        if mode == "trgm":
+            await conn.execute(SET_TRGM_THRESHOLD, _trgm_params(trgm_threshold))
+        res = (await conn.execute(sql, params)).fetchall()
+    courses = [dict(row._mapping) for row in res]
+    course_cache.set(key, courses, version)
+    return courses
+
+# -------------------------------------------
+# 🔹 البحث الدلالي (embeddings) على كامل الكتالوج
+# -------------------------------------------
+def _hydrate_query(ids):
+    sql = text(f"""
+        SELECT {COURSE_COLUMNS}
+        FROM courses
+        WHERE id = ANY(:ids)
+    """)
+    return sql, {"ids": [int(i) for i in ids]}
+
+
+def _rank_hydrated(rows, ids, scores):
+    by_id = {row["id"]: row for row in rows}
+    ranked = []
+    for course_id, score in zip(ids, scores):
+        course = by_id.get(int(course_id))
+        if course is not None:
+            course["match_score"] = round(float(score), 3)
+            ranked.append(course)
+    return ranked
+
+
+def search_courses_with_embeddings(user_profile: dict, limit=20):
+    """Semantic search over every embedded course (see embedding_search.py)."""
+    if not course_embeddings.ready:
+        return []
+    user_emb = get_embedding(profile_text(user_profile))
+    ids, scores = course_embeddings.search(user_emb, limit)
+
+    sql, params = _hydrate_query(ids)
+    with engine.connect() as conn:
+        rows = [dict(row._mapping) for row in conn.execute(sql, params)]
+    return _rank_hydrated(rows, ids, scores)
+
+
+async def search_courses_with_embeddings_async(user_profile: dict, limit=20):
+    if not course_embeddings.ready:
+        return []
+    user_emb = await get_embedding_async(profile_text(user_profile))
+    # ضرب مصفوفة على كامل الكتالوج: بـ thread عشان ما يوقف الـ event loop
+    ids, scores = await asyncio.to_thread(course_embeddings.search, user_emb, limit)
+
+    sql, params = _hydrate_query(ids)
+    async with async_engine.connect() as conn:
+        rows = [dict(row._mapping) for row in await conn.execute(sql, params)]
+    return _rank_hydrated(rows, ids, scores)
@@ -1,9 +1,15 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 import os
+import time
+import threading
 from dotenv import load_dotenv
 from supabase import create_client
+from metrics import stage_seconds, failures
 
 load_dotenv()
 
@@ -19,15 +25,148 @@ DATABASE_URL = os.getenv('DATABASE_URL')
 if not DATABASE_URL:
     raise RuntimeError('DATABASE_URL not set in .env')
 
-engine = create_engine(DATABASE_URL)
+
+def get_async_database_url(url: str) -> str:
+    """Rewrite a sync Postgres URL to use the asyncpg driver."""
+    scheme, _, rest = url.partition("://")
+    scheme = scheme.split("+")[0]
+    if scheme in ("postgres", "postgresql"):
+        scheme = "postgresql+asyncpg"
+    # asyncpg يستخدم ssl بدل sslmode
+    rest = rest.replace("sslmode=", "ssl=")
+    return f"{scheme}://{rest}"
+
+
+# -------------------------------------------
+# ⚙️ إعدادات الـ pool (مشتركة بين الـ engine العادي والـ async)
+# -------------------------------------------
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "500"))
+
+
+class PoolMetrics:
+    """How long checkouts waited for a connection (includes opening new ones)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, seconds, timed_out=False):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+            }
+
+
+_pools = {}  # name -> (engine, PoolMetrics)
+
+
+def _timed_pool_class(base, metrics):
+    # subclass لكل engine عشان pool.recreate() (بعد dispose) يحتفظ بنفس العدادات
+    class TimedPool(base):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            except PoolTimeoutError:
+                metrics.record(time.perf_counter() - start, timed_out=True)
+                raise
+            metrics.record(time.perf_counter() - start)
+            return connection
+
+    return TimedPool
+
+
+def _time_queries(sync_engine):
+    """Every cursor execute on the engine goes into the db_query stage histogram."""
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._query_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stage_seconds.observe(time.perf_counter() - context._query_start, "db_query")
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        failures.inc("db", type(exception_context.original_exception).__name__)
+
+
+def _pool_options(metrics, base_pool, overrides):
+    options = {
+        "poolclass": _timed_pool_class(base_pool, metrics),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "query_cache_size": DB_QUERY_CACHE_SIZE,
+    }
+    options.update(overrides)
+    return options
+
+
+def make_engine(url=DATABASE_URL, name="sync", **overrides):
+    """The one place sync engines are created; pool settings come from DB_POOL_* env vars."""
+    metrics = PoolMetrics()
+    new_engine = create_engine(url, **_pool_options(metrics, QueuePool, overrides))
+    _time_queries(new_engine)
+    _pools[name] = (new_engine, metrics)
+    return new_engine
+
+
+def make_async_engine(url=DATABASE_URL, name="async", **overrides):
+    metrics = PoolMetrics()
+    new_engine = create_async_engine(
+        get_async_database_url(url), **_pool_options(metrics, AsyncAdaptedQueuePool, overrides)
+    )
+    _time_queries(new_engine.sync_engine)
+    _pools[name] = (new_engine, metrics)
+    return new_engine
+
+
+def pool_stats() -> dict:
+    """Live pool usage per engine, to size DB_POOL_SIZE / DB_MAX_OVERFLOW from real traffic."""
+    stats = {}
+    for name, (pool_engine, metrics) in _pools.items():
+        pool = pool_engine.pool
+        stats[name] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            **metrics.stats(),
+        }
+    return stats
+
+
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# engine غير متزامن للـ routes (FastAPI async)
+async_engine = make_async_engine()
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
-
-
@@ -0,0 +1,111 @@
+# db_bootstrap.py
+"""
+One-off schema bootstrap for the course search backends.
+
+    python db_bootstrap.py            # everything
+    python db_bootstrap.py fts        # only the full-text column + index
+    python db_bootstrap.py trgm       # only pg_trgm + the trigram index
+    python db_bootstrap.py embeddings # the course embedding columns
+    python db_bootstrap.py catalog    # catalog_version counter read by the course search cache
+
+Safe to re-run: every statement is IF NOT EXISTS (or replaces itself). Indexes are built
+CONCURRENTLY so the courses table stays writable while they build.
+"""
+import sys
+from sqlalchemy import text
+from database import engine
+
+FTS_STATEMENTS = [
+    """
+    ALTER TABLE courses
+    ADD COLUMN IF NOT EXISTS title_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('english', coalesce(title, ''))) STORED
+    """,
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_courses_title_tsv ON courses USING gin (title_tsv)",
+]
+
+TRGM_STATEMENTS = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_courses_title_trgm ON courses USING gin (title gin_trgm_ops)",
+]
+
+EMBEDDING_STATEMENTS = [
+    "ALTER TABLE courses ADD COLUMN IF NOT EXISTS embedding text",
+    "ALTER TABLE courses ADD COLUMN IF NOT EXISTS embedded_update_date date",
+    # watermark لـ ann_index.py sync: يتغير لما يتغير الـ embedding أو الـ rating/reviews
+    "ALTER TABLE courses ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now()",
+    """
+    CREATE OR REPLACE FUNCTION courses_touch_updated_at() RETURNS trigger AS $$
+    BEGIN
+        IF NEW.embedding IS DISTINCT FROM OLD.embedding
+           OR NEW.rating IS DISTINCT FROM OLD.rating
+           OR NEW.num_reviews IS DISTINCT FROM OLD.num_reviews THEN
+            NEW.updated_at := now();
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS courses_touch_updated_at ON courses",
+    """
+    CREATE TRIGGER courses_touch_updated_at BEFORE UPDATE ON courses
+    FOR EACH ROW EXECUTE FUNCTION courses_touch_updated_at()
+    """,
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_courses_updated_at ON courses (updated_at)",
+]
+
+# search_cache.CATALOG_VERSION: عداد يزيد مع كل statement يغير الكورسات
+# (إضافة / حذف / truncate / تعديل عمود يرجع بنتائج البحث)، فيشمل تعديلات
+# نفس اليوم والحذف، والقراءة صف واحد
+CATALOG_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS catalog_version (
+        id boolean PRIMARY KEY DEFAULT true CHECK (id),
+        version bigint NOT NULL DEFAULT 0,
+        changed_at timestamptz NOT NULL DEFAULT now()
+    )
+    """,
+    "INSERT INTO catalog_version (id) VALUES (true) ON CONFLICT DO NOTHING",
+    """
+    CREATE OR REPLACE FUNCTION courses_bump_catalog_version() RETURNS trigger AS $$
+    BEGIN
+        UPDATE catalog_version SET version = version + 1, changed_at = now();
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS courses_bump_catalog_version ON courses",
+    """
+    CREATE TRIGGER courses_bump_catalog_version
+    AFTER INSERT OR DELETE OR UPDATE OF title, url, rating, num_reviews, num_published_lectures,
+        created, last_update_date, duration, instructors_id, image
+    ON courses FOR EACH STATEMENT EXECUTE FUNCTION courses_bump_catalog_version()
+    """,
+    "DROP TRIGGER IF EXISTS courses_bump_catalog_version_truncate ON courses",
+    """
+    CREATE TRIGGER courses_bump_catalog_version_truncate AFTER TRUNCATE ON courses
+    FOR EACH STATEMENT EXECUTE FUNCTION courses_bump_catalog_version()
+    """,
+]
+
+STEPS = {
+    "fts": FTS_STATEMENTS,
+    "trgm": TRGM_STATEMENTS,
+    "embeddings": EMBEDDING_STATEMENTS,
+    "catalog": CATALOG_STATEMENTS,
+}
+
+
+def run(steps=None):
+    steps = steps or list(STEPS)
+    # CREATE INDEX CONCURRENTLY لازم يكون خارج transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for step in steps:
+            print(f"[bootstrap] ▶️ {step}")
+            for statement in STEPS[step]:
+                conn.execute(text(statement))
+    print("[bootstrap] ✅ done")
+
+
+if __name__ == "__main__":
+    run(sys.argv[1:])
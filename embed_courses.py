@@ -0,0 +1,152 @@
+# embed_courses.py
+"""
+Offline pipeline that fills `courses.embedding`.
+
+    python embed_courses.py                     # embed new / changed courses
+    python embed_courses.py --fake --dim 64     # deterministic local vectors, no API calls
+    python embed_courses.py --restart           # ignore the checkpoint
+
+Rows are streamed in id order with a server-side cursor, embedded in large
+batches and written back with one UPDATE per batch. A course is (re)embedded
+when it has no embedding yet or its `last_update_date` differs from the
+`embedded_update_date` recorded with its vector. After every committed batch
+the last course id is written to a checkpoint file, so a crashed run resumes
+where it stopped; the file is removed once a run completes.
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import text
+from database import engine
+
+load_dotenv()
+
+EMBED_CHECKPOINT_PATH = os.getenv("EMBED_CHECKPOINT_PATH", "embed_courses.checkpoint.json")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "512"))
+EMBED_MAX_RETRIES = 3
+
+STALE_ROWS = text("""
+    SELECT id, title, last_update_date
+    FROM courses
+    WHERE id > :after_id
+      AND (embedding IS NULL OR embedded_update_date IS DISTINCT FROM last_update_date)
+    ORDER BY id
+""")
+
+# تحديث جماعي: صف واحد لكل batch بدل UPDATE لكل كورس
+BULK_UPDATE = text("""
+    UPDATE courses AS c
+    SET embedding = v.embedding, embedded_update_date = v.updated
+    FROM (
+        SELECT unnest(CAST(:ids AS integer[])) AS id,
+               unnest(CAST(:embeddings AS text[])) AS embedding,
+               unnest(CAST(:updated AS date[])) AS updated
+    ) AS v
+    WHERE c.id = v.id
+""")
+
+
+def openai_embeddings(texts: list):
+    from embedding_search import get_embeddings
+    return get_embeddings(texts)
+
+
+def fake_embeddings(texts: list, dim=64):
+    """Deterministic pseudo-embeddings (same text -> same vector) for local runs."""
+    vectors = []
+    for value in texts:
+        seed = int.from_bytes(hashlib.sha256(value.encode("utf-8")).digest()[:8], "little")
+        vectors.append(np.random.default_rng(seed).standard_normal(dim).astype(np.float32).tolist())
+    return vectors
+
+
+def _embed_with_retry(embed_fn, texts):
+    for attempt in range(EMBED_MAX_RETRIES):
+        try:
+            return embed_fn(texts)
+        except Exception as e:
+            if attempt == EMBED_MAX_RETRIES - 1:
+                raise
+            wait = 2 ** attempt
+            print(f"[Embed] ⚠️ batch failed ({e}), retrying in {wait}s")
+            time.sleep(wait)
+
+
+# -------------------------------------------
+# 🔹 Checkpoint
+# -------------------------------------------
+def load_checkpoint(path=EMBED_CHECKPOINT_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f).get("last_id", 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def save_checkpoint(last_id, path=EMBED_CHECKPOINT_PATH):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"last_id": last_id, "saved_at": time.time()}, f)
+    os.replace(tmp, path)
+
+
+def clear_checkpoint(path=EMBED_CHECKPOINT_PATH):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+# -------------------------------------------
+# 🔹 Pipeline
+# -------------------------------------------
+def run(embed_fn=openai_embeddings, batch_size=EMBED_BATCH_SIZE, checkpoint_path=EMBED_CHECKPOINT_PATH,
+        restart=False, limit=None):
+    after_id = 0 if restart else load_checkpoint(checkpoint_path)
+    if after_id:
+        print(f"[Embed] ▶️ resuming after course id {after_id}")
+
+    done = 0
+    start = time.time()
+    # اتصال للقراءة (cursor على السيرفر) واتصال ثاني للكتابة والـ commit لكل batch
+    with engine.connect() as reader, engine.connect() as writer:
+        result = reader.execution_options(stream_results=True, yield_per=batch_size).execute(
+            STALE_ROWS, {"after_id": after_id}
+        )
+        for batch in result.partitions(batch_size):
+            if limit is not None:
+                batch = batch[:limit - done]
+            vectors = _embed_with_retry(embed_fn, [row.title or "" for row in batch])
+            writer.execute(BULK_UPDATE, {
+                "ids": [row.id for row in batch],
+                "embeddings": [json.dumps(v) for v in vectors],
+                "updated": [row.last_update_date for row in batch],
+            })
+            writer.commit()
+            save_checkpoint(batch[-1].id, checkpoint_path)
+
+            done += len(batch)
+            print(f"[Embed] {done} courses embedded (last id {batch[-1].id}, {done / (time.time() - start):.0f}/s)")
+            if limit is not None and done >= limit:
+                # تشغيل جزئي: نخلي الـ checkpoint عشان نكمل بعدين
+                return done
+
+    clear_checkpoint(checkpoint_path)
+    print(f"[Embed] ✅ done, {done} courses embedded in {time.time() - start:.1f}s")
+    return done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed new and changed courses")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--checkpoint", default=EMBED_CHECKPOINT_PATH)
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--limit", type=int, default=None, help="stop after N courses")
+    parser.add_argument("--fake", action="store_true", help="use local deterministic vectors")
+    parser.add_argument("--dim", type=int, default=64, help="vector size for --fake")
+    args = parser.parse_args()
+
+    embed_fn = (lambda texts: fake_embeddings(texts, args.dim)) if args.fake else openai_embeddings
+    run(embed_fn, args.batch_size, args.checkpoint, args.restart, args.limit)
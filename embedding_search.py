@@ -0,0 +1,220 @@
+# embedding_search.py
+import os
+import json
+import time
+import numpy as np
+from dotenv import load_dotenv
+from openai import OpenAI, AsyncOpenAI
+from sqlalchemy import text
+from database import engine
+from embedding_store import open_store
+
+load_dotenv()
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+# float16 يقلل الذاكرة للنص، والحساب يصير على دفعات float32
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "float32")
+
+client = OpenAI(api_key=OPENAI_API_KEY)
+async_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+
+# نفس أوزان النسخة القديمة: similarity * 10 + rating * 0.5 + min(reviews / 1000, 5)
+SIMILARITY_WEIGHT = 10.0
+RATING_WEIGHT = 0.5
+REVIEWS_CAP = 5.0
+
+SCORE_CHUNK_ROWS = 65536
+# كل كم ثانية نتأكد إذا انتشر snapshot جديد لملف الـ store
+STORE_RELOAD_INTERVAL = float(os.getenv("EMBEDDING_STORE_RELOAD_INTERVAL", "30"))
+
+
+# -------------------------------------------
+# 🔹 Embeddings
+# -------------------------------------------
+def get_embeddings(texts: list):
+    response = client.embeddings.create(model=EMBEDDING_MODEL, input=texts)
+    return [item.embedding for item in response.data]
+
+
+def get_embedding(text_value: str):
+    return get_embeddings([text_value])[0]
+
+
+async def get_embedding_async(text_value: str):
+    response = await async_client.embeddings.create(model=EMBEDDING_MODEL, input=[text_value])
+    return response.data[0].embedding
+
+
+def profile_text(user_profile: dict) -> str:
+    parts = [
+        user_profile.get("college"),
+        user_profile.get("department"),
+        user_profile.get("major"),
+        *(user_profile.get("skills") or []),
+        user_profile.get("career_goal"),
+    ]
+    return " ".join(p for p in parts if p)
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def popularity_boost(ratings, reviews):
+    ratings = np.nan_to_num(np.asarray(ratings, dtype=np.float32))
+    reviews = np.nan_to_num(np.asarray(reviews, dtype=np.float32))
+    return ratings * RATING_WEIGHT + np.minimum(reviews / 1000.0, REVIEWS_CAP)
+
+
+# -------------------------------------------
+# 🔹 الفهرس
+# -------------------------------------------
+class EmbeddingIndex:
+    """
+    Exact semantic search over the whole catalog. Embeddings are held as one
+    contiguous, L2-normalized (n, dim) matrix so scoring a query is a single
+    matrix-vector product; the rating/review boost is precomputed per row.
+    """
+
+    def __init__(self, dtype=EMBEDDING_DTYPE):
+        self.dtype = np.dtype(dtype)
+        self._data = None  # (ids, matrix, boost)
+        self.loaded_at = None
+        self.store_path = None
+        self._store_inode = None
+        self.ann = None  # IVFIndex من ann_index.py، لو موجود يخدم البحث بدل الـ exact
+        self.ann_path = None
+        self._ann_inode = None
+
+    def attach_ann(self, ann, path=None):
+        """Serve searches from an IVFIndex; with `path`, re-load it when `ann_index.py sync` republishes it."""
+        self._ann_inode = os.stat(path).st_ino if path else None
+        self.ann, self.ann_path = ann, path
+
+    @property
+    def ready(self):
+        if self.ann is not None:
+            return len(self.ann) > 0
+        return self._data is not None and len(self._data[0]) > 0
+
+    def __len__(self):
+        if self.ann is not None:
+            return len(self.ann)
+        return 0 if self._data is None else len(self._data[0])
+
+    def load(self, ids, vectors, ratings, reviews):
+        matrix = np.ascontiguousarray(normalize_rows(vectors), dtype=self.dtype)
+        boost = popularity_boost(ratings, reviews)
+        # استبدال ذري: الطلبات الجارية تكمل على النسخة القديمة
+        self._data = (np.asarray(ids, dtype=np.int64), matrix, boost)
+        self.loaded_at = time.time()
+        return len(ids)
+
+    def load_from_db(self, batch_size=2000):
+        """Read every embedded course once (works for text/JSON and pgvector columns)."""
+        sql = text("""
+            SELECT id, rating, num_reviews, embedding::text
+            FROM courses
+            WHERE embedding IS NOT NULL
+        """)
+        ids, ratings, reviews, vectors = [], [], [], []
+        start = time.time()
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(sql)
+            for course_id, rating, num_reviews, embedding in result:
+                ids.append(course_id)
+                ratings.append(rating or 0)
+                reviews.append(num_reviews or 0)
+                vectors.append(np.asarray(json.loads(embedding), dtype=np.float32))
+        if not ids:
+            print("[Embeddings] ⚠️ لا توجد embeddings في جدول courses")
+            return 0
+        count = self.load(ids, np.vstack(vectors), ratings, reviews)
+        print(f"[Embeddings] ✅ loaded {count} course vectors in {time.time() - start:.1f}s")
+        return count
+
+    def load_store(self, path):
+        """Memory-map a snapshot written by embedding_store.py (shared page cache)."""
+        inode = os.stat(path).st_ino
+        self._data = open_store(path)
+        self.store_path, self._store_inode = path, inode
+        self.loaded_at = time.time()
+        print(f"[Embeddings] ✅ mapped {len(self)} course vectors from {path}")
+        return len(self)
+
+    def reload_if_changed(self):
+        """
+        Re-map the store (or the ANN index) after os.replace published a new
+        snapshot. Blocking; main.py calls it from a thread every
+        STORE_RELOAD_INTERVAL seconds, never on the request path.
+        """
+        if self.store_path is None and self.ann_path is None:
+            return False
+        try:
+            if self.ann_path is not None:
+                # st_ino يتبع الـ symlink: يتغير مع كل نسخة جديدة من ann_index.py
+                if not os.path.exists(self.ann_path):
+                    return False  # الفهرس انحذف: نكمل على اللي بالذاكرة
+                if os.stat(self.ann_path).st_ino == self._ann_inode:
+                    return False
+                from ann_index import IVFIndex
+                self.attach_ann(IVFIndex.load(self.ann_path), self.ann_path)
+                return True
+            if os.stat(self.store_path).st_ino == self._store_inode:
+                return False
+            self.load_store(self.store_path)
+            return True
+        except (OSError, ValueError) as e:
+            print(f"[Embeddings] ⚠️ فشل تحميل الـ snapshot الجديد: {e}")
+            return False
+
+    @staticmethod
+    def _similarities(matrix, queries):
+        """(b, n) cosine similarities for (b, dim) normalized queries."""
+        if matrix.dtype == np.float32:
+            return queries @ matrix.T
+        out = np.empty((queries.shape[0], matrix.shape[0]), dtype=np.float32)
+        for start in range(0, matrix.shape[0], SCORE_CHUNK_ROWS):
+            block = matrix[start:start + SCORE_CHUNK_ROWS].astype(np.float32)
+            out[:, start:start + SCORE_CHUNK_ROWS] = queries @ block.T
+        return out
+
+    def _top_k(self, matrix, boost, queries, k):
+        scores = self._similarities(matrix, queries)
+        scores *= SIMILARITY_WEIGHT
+        scores += boost
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def search_batch(self, query_vectors, k=20, batch_size=64):
+        """
+        Top-k for many queries at once. Returns (ids, scores), both (b, k),
+        best first. Queries are scored `batch_size` at a time to bound the
+        (batch, n) score matrix. With an ANN index attached only its
+        probed lists are scored.
+        """
+        if self.ann is not None:
+            return self.ann.search_batch(query_vectors, k)
+        ids, matrix, boost = self._data
+        queries = normalize_rows(np.atleast_2d(query_vectors))
+        k = min(k, len(ids))
+        rows, scores = [], []
+        for start in range(0, queries.shape[0], batch_size):
+            top, top_scores = self._top_k(matrix, boost, queries[start:start + batch_size], k)
+            rows.append(top)
+            scores.append(top_scores)
+        return ids[np.concatenate(rows)], np.concatenate(scores)
+
+    def search(self, query_vector, k=20):
+        ids, scores = self.search_batch(query_vector, k)
+        return ids[0], scores[0]
+
+
+course_embeddings = EmbeddingIndex()
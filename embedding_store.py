@@ -0,0 +1,182 @@
+# embedding_store.py
+"""
+On-disk course embedding snapshot, memory-mapped read-only so every uvicorn
+worker shares the same OS page cache instead of holding its own copy.
+
+Layout (little-endian):
+    header   64 bytes   magic, version, dtype code, n, dim, capacity,
+                        snapshot_at (DB epoch seconds the rows were read at, 0 = unknown)
+    ids      capacity * int64
+    boost    capacity * float32  precomputed rating/review boost
+    vectors  capacity * dim * (float32 | float16), row-major, L2-normalized,
+             starting at a 64-byte aligned offset
+
+`capacity` is the row count the builder expected; only the first `n`
+rows of each block are valid.
+
+    python embedding_store.py build [--out PATH] [--dtype float16]
+
+A new snapshot is written next to the target and moved into place with
+os.replace, so readers never see a half-written file; running workers pick
+it up on their next reload check.
+"""
+import os
+import json
+import struct
+import argparse
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+load_dotenv()
+
+EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH", "course_embeddings.bin")
+
+MAGIC = b"PATHEMB1"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQIQd")  # magic, version, dtype code, n, dim, capacity, snapshot_at
+HEADER_SIZE = 64
+DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f2")}
+DTYPE_CODES = {np.dtype("<f4"): 1, np.dtype("<f2"): 2}
+
+
+def _align(offset, to=64):
+    return (offset + to - 1) // to * to
+
+
+def _layout(n, dim, dtype):
+    ids_offset = HEADER_SIZE
+    boost_offset = ids_offset + n * 8
+    vectors_offset = _align(boost_offset + n * 4)
+    size = vectors_offset + n * dim * dtype.itemsize
+    return ids_offset, boost_offset, vectors_offset, size
+
+
+class StoreWriter:
+    """Writes a snapshot row by row into a temp file, then publishes it atomically."""
+
+    def __init__(self, path, capacity, dim, dtype="float32", snapshot_at=0.0):
+        self.path = path
+        self.snapshot_at = snapshot_at
+        self.tmp_path = f"{path}.tmp-{os.getpid()}"
+        self.capacity = capacity
+        self.dim = dim
+        self.dtype = np.dtype(dtype).newbyteorder("<")
+        self.count = 0
+
+        ids_offset, boost_offset, vectors_offset, size = _layout(capacity, dim, self.dtype)
+        with open(self.tmp_path, "wb") as f:
+            f.truncate(size)
+        self._ids = np.memmap(self.tmp_path, "<i8", "r+", ids_offset, (capacity,))
+        self._boost = np.memmap(self.tmp_path, "<f4", "r+", boost_offset, (capacity,))
+        self._vectors = np.memmap(self.tmp_path, self.dtype, "r+", vectors_offset, (capacity, dim))
+
+    def append(self, ids, vectors, boost):
+        """Append a batch; vectors must already be L2-normalized."""
+        n = min(len(ids), self.capacity - self.count)
+        end = self.count + n
+        self._ids[self.count:end] = ids[:n]
+        self._boost[self.count:end] = boost[:n]
+        self._vectors[self.count:end] = vectors[:n]
+        self.count = end
+        return n
+
+    def publish(self):
+        """Write the header, fsync and swap the file into place."""
+        for array in (self._ids, self._boost, self._vectors):
+            array.flush()
+        del self._ids, self._boost, self._vectors
+
+        # n الحقيقي ممكن يكون أقل من الـ capacity
+        with open(self.tmp_path, "r+b") as f:
+            f.write(HEADER.pack(
+                MAGIC, VERSION, DTYPE_CODES[self.dtype], self.count, self.dim, self.capacity, self.snapshot_at,
+            ))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.tmp_path, self.path)
+        return self.count
+
+    def abort(self):
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def _read_header(path):
+    with open(path, "rb") as f:
+        magic, version, dtype_code, n, dim, capacity, snapshot_at = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not an embedding store (v{VERSION})")
+    return dtype_code, n, dim, capacity, snapshot_at
+
+
+def snapshot_time(path=EMBEDDING_STORE_PATH):
+    """DB time (epoch seconds) the snapshot's rows were read at, or None for older files."""
+    return _read_header(path)[4] or None
+
+
+def open_store(path=EMBEDDING_STORE_PATH):
+    """Returns (ids, matrix, boost) as read-only memmaps."""
+    dtype_code, n, dim, capacity, _ = _read_header(path)
+
+    dtype = DTYPES[dtype_code]
+    ids_offset, boost_offset, vectors_offset, _ = _layout(capacity, dim, dtype)
+    ids = np.memmap(path, "<i8", "r", ids_offset, (n,))
+    boost = np.memmap(path, "<f4", "r", boost_offset, (n,))
+    matrix = np.memmap(path, dtype, "r", vectors_offset, (n, dim))
+    return ids, matrix, boost
+
+
+# -------------------------------------------
+# 🔹 البناء من جدول courses
+# -------------------------------------------
+def build_from_db(path=EMBEDDING_STORE_PATH, dtype="float32", batch_size=2000):
+    from database import engine
+    from embedding_search import normalize_rows, popularity_boost
+
+    # snapshot متسق: العدد والصفوف من نفس الـ transaction
+    with engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+        # now() بـ REPEATABLE READ = وقت بداية الـ snapshot، وهو الـ watermark لـ ann_index.py sync
+        snapshot_at = conn.execute(text("SELECT extract(epoch FROM now())")).scalar()
+        capacity = conn.execute(text("SELECT count(*) FROM courses WHERE embedding IS NOT NULL")).scalar()
+        if not capacity:
+            print("[Embedding store] ⚠️ لا توجد embeddings في جدول courses")
+            return 0
+
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(text("""
+            SELECT id, rating, num_reviews, embedding::text
+            FROM courses
+            WHERE embedding IS NOT NULL
+            ORDER BY id
+        """))
+
+        writer = None
+        try:
+            for batch in result.partitions(batch_size):
+                vectors = np.array([json.loads(row[3]) for row in batch], dtype=np.float32)
+                if writer is None:
+                    writer = StoreWriter(path, capacity, vectors.shape[1], dtype, float(snapshot_at))
+                writer.append(
+                    np.array([row[0] for row in batch], dtype=np.int64),
+                    normalize_rows(vectors),
+                    popularity_boost([row[1] or 0 for row in batch], [row[2] or 0 for row in batch]),
+                )
+            count = writer.publish()
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            raise
+
+    print(f"[Embedding store] ✅ published {count} vectors to {path}")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Course embedding store")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--out", default=EMBEDDING_STORE_PATH)
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    build_from_db(args.out, args.dtype, args.batch_size)
@@ -0,0 +1,119 @@
+# fast_planner.py
+"""
+Deterministic learning-path planner (no LLM). Used for mode=fast and as the
+fallback when the GPT call fails or misses its deadline. Produces the same
+[{step, title, url, duration, notes, image}] shape as the prompt asks for.
+"""
+import re
+import math
+import datetime
+
+LEVELS = ("beginner", "intermediate", "advanced")
+LEVEL_CUES = {
+    "beginner": ("beginner", "beginners", "intro", "introduction", "fundamentals", "basics", "101",
+                 "zero", "essentials", "getting started", "crash course", "first steps"),
+    "advanced": ("advanced", "mastering", "masterclass", "expert", "deep dive", "in-depth",
+                 "professional", "architect", "production", "optimization"),
+}
+# نفس التقدير اللي يطلبه الـ prompt لما المدة مش موجودة
+ESTIMATED_DURATION = {"beginner": "3 hours", "intermediate": "6 hours", "advanced": "10 hours"}
+
+COVERAGE_WEIGHT = 3.0
+RATING_WEIGHT = 1.0
+REVIEWS_WEIGHT = 1.0
+RECENCY_WEIGHT = 0.5
+REVIEWS_SCALE = math.log1p(100_000)
+
+WORD_RE = re.compile(r"[\w+#]+")
+
+
+def _words(value) -> set:
+    return set(WORD_RE.findall(str(value or "").lower()))
+
+
+def _phrases(values) -> list:
+    """Lower-cased phrases as word tuples, e.g. "Machine Learning" -> ("machine", "learning")."""
+    phrases = []
+    for value in values or []:
+        words = tuple(WORD_RE.findall(str(value).lower()))
+        if words and words not in phrases:
+            phrases.append(words)
+    return phrases
+
+
+def _covers(title_words: set, phrase: tuple) -> bool:
+    return all(word in title_words for word in phrase)
+
+
+def infer_level(title: str) -> str:
+    padded = " " + " ".join(WORD_RE.findall(str(title or "").lower())) + " "
+    for level in ("advanced", "beginner"):
+        if any(f" {cue} " in padded for cue in LEVEL_CUES[level]):
+            return level
+    return "intermediate"
+
+
+def _recency(value, today) -> float:
+    if not value:
+        return 0.0
+    if isinstance(value, str):
+        try:
+            value = datetime.date.fromisoformat(value[:10])
+        except ValueError:
+            return 0.0
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    age_years = max((today - value).days, 0) / 365.0
+    return 1.0 / (1.0 + age_years)
+
+
+def _target_phrases(user_data: dict, high_demand):
+    known = _phrases(user_data.get("skills"))
+    targets = _phrases([user_data.get("career_goal"), user_data.get("major"), *(high_demand or [])])
+    # المهارات اللي يعرفها المستخدم ما تحسب كتغطية
+    return [p for p in targets if p not in known], known
+
+
+def plan_learning_path(user_data: dict, courses: list, high_demand=None, max_steps=8):
+    targets, known = _target_phrases(user_data, high_demand)
+    today = datetime.date.today()
+
+    candidates = []
+    for course in courses:
+        title_words = _words(course.get("title"))
+        covered = [p for p in targets if _covers(title_words, p)]
+        # كورس عن مهارة يعرفها المستخدم ينشال إلا إذا يغطي شي جديد
+        if not covered and any(_covers(title_words, p) for p in known):
+            continue
+
+        coverage = len(covered) / len(targets) if targets else 0.0
+        rating = float(course.get("rating") or 0)
+        reviews = float(course.get("num_reviews") or 0)
+        score = (
+            COVERAGE_WEIGHT * coverage
+            + RATING_WEIGHT * min(rating, 5.0) / 5.0
+            + REVIEWS_WEIGHT * math.log1p(max(reviews, 0)) / REVIEWS_SCALE
+            + RECENCY_WEIGHT * _recency(course.get("last_update_date"), today)
+        )
+        candidates.append((score, covered, infer_level(course.get("title")), course))
+
+    chosen = sorted(candidates, key=lambda c: c[0], reverse=True)[:max_steps]
+    chosen.sort(key=lambda c: (LEVELS.index(c[2]), -c[0]))
+
+    path = []
+    for number, (score, covered, level, course) in enumerate(chosen, 1):
+        notes = f"{level.capitalize()} course"
+        if covered:
+            notes += " covering " + ", ".join(" ".join(p) for p in covered[:3])
+        if course.get("rating"):
+            notes += f" (rated {course['rating']}"
+            notes += f", {int(course['num_reviews'])} reviews)" if course.get("num_reviews") else ")"
+        path.append({
+            "step": number,
+            "title": course.get("title"),
+            "url": course.get("url"),
+            "duration": course.get("duration") or ESTIMATED_DURATION[level],
+            "notes": notes + ".",
+            "image": course.get("image") or "",
+        })
+    return path
@@ -8,64 +8,101 @@
 #     return df[df['demand_level'] == 'High']['skill'].tolist()
 # job_market.py
 import os
-import requests
 from dotenv import load_dotenv
-from openai import OpenAI
+from llm_cache import cached_chat_completion, cached_chat_completion_async
+from openai import OpenAI, AsyncOpenAI
+from adzuna_client import adzuna
+from adzuna_harvester import harvest, harvest_async
+import job_store
+from skill_extractor import top_skills, MARKET_SKILLS_GPT
+from skill_taxonomy import canonicalize
+import metrics
 
 load_dotenv()
 
 # تحميل مفاتيح API
-ADZUNA_APP_ID = os.getenv("ADZUNA_APP_ID")
-ADZUNA_APP_KEY = os.getenv("ADZUNA_APP_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 client = OpenAI(api_key=OPENAI_API_KEY)
+async_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
 
 
-def get_high_demand_skills(country="us", keyword="software engineer", results_limit=15):
+def _job_descriptions(jobs, country):
+    if not jobs:
+        print("[Adzuna] ⚠️ لا توجد وظائف مطابقة.")
+        return None
+
+    print(f"[Adzuna] ✅ تم جلب {len(jobs)} وظيفة من سوق العمل ({country.upper()})")
+    return [job.get("description", "") for job in jobs]
+
+
+def _local_skills(descriptions, limit=15):
+    # عدّ المهارات محلياً (Aho-Corasick) بدل ما نرسل النص لـ GPT
+    return top_skills(descriptions, limit)
+
+
+def get_high_demand_skills(country="us", keyword="software engineer", results_limit=15, pages=1, refresh=False):
     """
     🔹 جلب المهارات المطلوبة من سوق العمل الحقيقي باستخدام Adzuna API
+    pages > 1 يستخدم الـ harvester (عدة صفحات بالتوازي، بدون cache)
+    refresh=True يتجاوز الـ job store ويجيب وظائف جديدة أولاً
     """
-    base_url = f"https://api.adzuna.com/v1/api/jobs/{country}/search/1"
-    params = {
-        "app_id": ADZUNA_APP_ID,
-        "app_key": ADZUNA_APP_KEY,
-        "results_per_page": results_limit,
-        "what": keyword,
-        "content-type": "application/json"
-    }
-
     try:
-        response = requests.get(base_url, params=params)
-        if response.status_code != 200:
-            print(f"[Adzuna] ❌ فشل الاتصال بالكود: {response.status_code}")
+        # الوظائف المخزنة تكفي؟ استعلام واحد بدل Adzuna
+        skills = None if refresh else job_store.top_skills(keyword, country)
+        if skills:
+            return skills
+
+        if pages > 1:
+            jobs = harvest(country, keyword, max_pages=pages)["jobs"]
+        else:
+            jobs = adzuna.search(country, keyword, results_limit)
+        descriptions = _job_descriptions(jobs, country)
+        if descriptions is None:
             return []
 
-        data = response.json()
-        jobs = data.get("results", [])
+        job_store.ingest(jobs, keyword, country)
+        # تحليل النصوص لاستخراج المهارات المطلوبة (من كل الوظائف المخزنة لو تكفي)
+        skills = job_store.top_skills(keyword, country) or _local_skills(descriptions)
+        if MARKET_SKILLS_GPT:
+            skills = canonicalize(skills + extract_skills_from_text(" ".join(descriptions)))
+        return skills
 
-        if not jobs:
-            print("[Adzuna] ⚠️ لا توجد وظائف مطابقة.")
-            return []
+    except Exception as e:
+        print(f"[Adzuna] ⚠️ خطأ أثناء جلب البيانات: {e}")
+        return []
 
-        descriptions = [job.get("description", "") for job in jobs]
-        combined_text = " ".join(descriptions)
 
-        print(f"[Adzuna] ✅ تم جلب {len(jobs)} وظيفة من سوق العمل ({country.upper()})")
+async def get_high_demand_skills_async(country="us", keyword="software engineer", results_limit=15, pages=1, refresh=False):
+    """
+    🔹 نفس get_high_demand_skills لكن بدون حجز thread (httpx)
+    """
+    try:
+        skills = None if refresh else await job_store.top_skills_async(keyword, country)
+        if skills:
+            return skills
 
-        # تحليل النصوص لاستخراج المهارات المطلوبة
-        return extract_skills_from_text(combined_text)
+        if pages > 1:
+            jobs = (await harvest_async(country, keyword, max_pages=pages))["jobs"]
+        else:
+            jobs = await adzuna.search_async(country, keyword, results_limit)
+        descriptions = _job_descriptions(jobs, country)
+        if descriptions is None:
+            return []
+
+        await job_store.ingest_async(jobs, keyword, country)
+        skills = await job_store.top_skills_async(keyword, country) or _local_skills(descriptions)
+        if MARKET_SKILLS_GPT:
+            skills = canonicalize(skills + await extract_skills_from_text_async(" ".join(descriptions)))
+        return skills
 
     except Exception as e:
         print(f"[Adzuna] ⚠️ خطأ أثناء جلب البيانات: {e}")
         return []
 
 
-def extract_skills_from_text(job_descriptions_text):
-    """
-    🔹 تحليل نصوص الوظائف واستخراج المهارات باستخدام GPT
-    """
-    prompt = f"""
+def _extract_skills_prompt(job_descriptions_text):
+    return f"""
     Analyze the following job descriptions and list the top 15 most in-demand skills required for these jobs.
     Return only a valid Python list of skill names.
 
@@ -73,21 +110,42 @@ def extract_skills_from_text(job_descriptions_text):
     {job_descriptions_text[:5000]}
     """
 
-    response = client.chat.completions.create(
+
+def _parse_skills_list(skills_text):
+    with metrics.timed("json_parse"):
+        try:
+            skills_list = eval(skills_text)
+            if isinstance(skills_list, list):
+                return skills_list
+        except Exception:
+            pass
+    metrics.failures.inc("openai", "invalid_json")
+    return [skills_text]
+
+
+def extract_skills_from_text(job_descriptions_text):
+    """
+    🔹 تحليل نصوص الوظائف واستخراج المهارات باستخدام GPT
+    """
+    content = cached_chat_completion(
+        client,
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": _extract_skills_prompt(job_descriptions_text)}],
+        temperature=0.3,
+    )
+
+    return _parse_skills_list(content.strip())
+
+
+async def extract_skills_from_text_async(job_descriptions_text):
+    content = await cached_chat_completion_async(
+        async_client,
         model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
+        messages=[{"role": "user", "content": _extract_skills_prompt(job_descriptions_text)}],
         temperature=0.3,
     )
 
-    skills_text = response.choices[0].message.content.strip()
-    try:
-        skills_list = eval(skills_text)
-        if isinstance(skills_list, list):
-            return skills_list
-        else:
-            return [skills_text]
-    except Exception:
-        return [skills_text]
+    return _parse_skills_list(content.strip())
 
 
 # # 🔹 fallback في حال فشل Adzuna
@@ -0,0 +1,342 @@
+# job_store.py
+"""
+Local corpus of Adzuna job postings.
+
+Every posting we fetch is kept in job_postings, keyed by Adzuna id so
+re-fetching is idempotent. Its canonical skills are extracted once into
+job_posting_skills, and job_posting_searches records which
+(career_goal, country) searches returned it and when. "Top skills for X
+in Y" is then one indexed aggregate over recently seen postings instead of
+an Adzuna + LLM round trip. New postings also bump the weekly demand
+counters read by skill_trends.py, in the same transaction.
+
+    python job_store.py "data analyst" --country us   # top skills from the store
+    python job_store.py --reextract                   # after a skill_taxonomy.json change
+"""
+import os
+import time
+import asyncio
+import argparse
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import select, update, delete, func, text
+from sqlalchemy.dialects.postgresql import insert
+from database import engine, async_engine
+from models import JobPosting, JobPostingSearch, JobPostingSkill, SkillDemandWeek, JobPostingWeek
+from skill_extractor import posting_skills
+from skill_taxonomy import taxonomy
+
+load_dotenv()
+
+JOB_STORE = os.getenv("JOB_STORE", "1") == "1"
+# أقل عدد وظائف حديثة عشان نجاوب من الـ store بدل Adzuna
+# (المسار المباشر يخزن صفحة وحدة = results_limit=15 بـ job_market، فالحد ما يزيد عنها)
+JOB_STORE_MIN_POSTINGS = int(os.getenv("JOB_STORE_MIN_POSTINGS", "15"))
+# الوظائف اللي ما شفناها بالبحث من فترة ما تدخل بالحساب
+JOB_STORE_MAX_AGE_DAYS = float(os.getenv("JOB_STORE_MAX_AGE_DAYS", "14"))
+# نفس نتائج Adzuna (من الـ cache) ما نعيد كتابتها قبل هالمدة
+JOB_STORE_REINGEST_SECONDS = float(os.getenv("JOB_STORE_REINGEST_SECONDS", str(60 * 60)))
+
+TABLES = (
+    JobPosting.__table__, JobPostingSearch.__table__, JobPostingSkill.__table__,
+    SkillDemandWeek.__table__, JobPostingWeek.__table__,
+)
+
+RECENT_POSTINGS = text("""
+    SELECT count(*) FROM job_posting_searches
+    WHERE career_goal = :goal AND country = :country AND seen_at >= :since
+""")
+TOP_SKILLS = text("""
+    SELECT s.skill, count(*) AS postings
+    FROM job_posting_searches q
+    JOIN job_posting_skills s ON s.posting_id = q.posting_id
+    WHERE q.career_goal = :goal AND q.country = :country AND q.seen_at >= :since
+    GROUP BY s.skill
+    ORDER BY postings DESC, s.skill
+    LIMIT :limit
+""")
+
+_tables_ready = False
+_tables_lock = threading.Lock()
+_recent = {}  # (career_goal, country) -> (ingested_at, posting ids)
+
+
+def normalize_key(career_goal, country="us"):
+    goal = " ".join((career_goal or "").lower().split())
+    return goal, (country or "us").strip().lower()
+
+
+def ensure_tables():
+    global _tables_ready
+    if _tables_ready:
+        return
+    with _tables_lock:
+        if not _tables_ready:
+            for table in TABLES:
+                table.create(bind=engine, checkfirst=True)
+            _tables_ready = True
+
+
+def week_start(value) -> date:
+    """Monday of the value's week (same as Postgres date_trunc('week'))."""
+    if isinstance(value, datetime):
+        value = value.date()
+    return value - timedelta(days=value.weekday())
+
+
+def _parse_created(value):
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
+    except (TypeError, ValueError):
+        return None
+
+
+def _prepare(jobs, career_goal, country):
+    """(key, postings by id, insert statement, search-link statement), or None when there is nothing to write."""
+    key = normalize_key(career_goal, country)
+    goal, country = key
+    now = datetime.utcnow()
+    postings = {}
+    for job in jobs or ():
+        job_id = str(job.get("id") or "")
+        if not job_id or job_id in postings:
+            continue
+        postings[job_id] = {
+            "id": job_id,
+            "country": country,
+            "title": job.get("title"),
+            "company": (job.get("company") or {}).get("display_name"),
+            "description": job.get("description") or "",
+            "created": _parse_created(job.get("created")),
+            "ingested_at": now,
+            "taxonomy_version": taxonomy.version,
+        }
+    if not goal or not postings:
+        return None
+
+    seen = _recent.get(key)
+    if seen and postings.keys() <= seen[1] and time.time() - seen[0] < JOB_STORE_REINGEST_SECONDS:
+        return None
+
+    # ترتيب ثابت للمفاتيح عشان الـ ingest المتزامن ما يعمل deadlock
+    ordered = sorted(postings)
+    insert_postings = (
+        insert(JobPosting)
+        .values([postings[job_id] for job_id in ordered])
+        .on_conflict_do_nothing(index_elements=[JobPosting.id])
+        .returning(JobPosting.id)
+    )
+    link = insert(JobPostingSearch).values([
+        {"career_goal": goal, "country": country, "posting_id": job_id, "seen_at": now}
+        for job_id in ordered
+    ])
+    link = link.on_conflict_do_update(
+        index_elements=[JobPostingSearch.career_goal, JobPostingSearch.country, JobPostingSearch.posting_id],
+        set_={"seen_at": link.excluded.seen_at},
+    )
+    return key, postings, insert_postings, link
+
+
+def _skill_rows(skills):
+    """skills: {posting id: set of skills} -> job_posting_skills rows."""
+    return [
+        {"posting_id": job_id, "skill": skill}
+        for job_id, posting in skills.items()
+        for skill in sorted(posting)
+    ]
+
+
+# -------------------------------------------
+# 🔹 عدادات الطلب الأسبوعية (skill_trends.py)
+# -------------------------------------------
+def counter_statements(postings, sign=1, volume=True):
+    """
+    Upserts adding `sign` per posting to the weekly counters.
+    postings: iterable of (country, posted_at, skills).
+    """
+    skills = Counter()
+    weeks = Counter()
+    for country, posted_at, posting_skills in postings:
+        week = week_start(posted_at)
+        weeks[(country, week)] += sign
+        for skill in posting_skills:
+            skills[(country, skill, week)] += sign
+
+    statements = []
+    rows = [
+        {"country": country, "skill": skill, "week": week, "postings": n}
+        for (country, skill, week), n in sorted(skills.items()) if n
+    ]
+    if rows:
+        stmt = insert(SkillDemandWeek).values(rows)
+        statements.append(stmt.on_conflict_do_update(
+            index_elements=[SkillDemandWeek.country, SkillDemandWeek.skill, SkillDemandWeek.week],
+            set_={"postings": SkillDemandWeek.postings + stmt.excluded.postings},
+        ))
+    if volume and weeks:
+        stmt = insert(JobPostingWeek).values([
+            {"country": country, "week": week, "postings": n} for (country, week), n in sorted(weeks.items())
+        ])
+        statements.append(stmt.on_conflict_do_update(
+            index_elements=[JobPostingWeek.country, JobPostingWeek.week],
+            set_={"postings": JobPostingWeek.postings + stmt.excluded.postings},
+        ))
+    return statements
+
+
+def _new_posting_statements(postings, new_ids):
+    """Skill rows and weekly counter upserts for postings inserted just now."""
+    skills = {job_id: posting_skills(postings[job_id]["description"]) for job_id in new_ids}
+    statements = counter_statements(
+        (postings[job_id]["country"], postings[job_id]["created"] or postings[job_id]["ingested_at"], skills[job_id])
+        for job_id in new_ids
+    )
+    rows = _skill_rows(skills)
+    if rows:
+        statements.insert(0, insert(JobPostingSkill).values(rows).on_conflict_do_nothing())
+    return statements
+
+
+def ingest(jobs, career_goal, country="us"):
+    """Store the postings one search returned; returns how many were new. Never raises."""
+    if not JOB_STORE:
+        return 0
+    try:
+        ensure_tables()
+        prepared = _prepare(jobs, career_goal, country)
+        if prepared is None:
+            return 0
+        key, postings, insert_postings, link = prepared
+        with engine.begin() as conn:
+            new_ids = conn.execute(insert_postings).scalars().all()
+            for statement in _new_posting_statements(postings, new_ids):
+                conn.execute(statement)
+            conn.execute(link)
+        _recent[key] = (time.time(), frozenset(postings))
+        return len(new_ids)
+    except Exception as e:
+        print(f"[Job store] ⚠️ فشل حفظ الوظائف: {e}")
+        return 0
+
+
+async def ingest_async(jobs, career_goal, country="us"):
+    if not JOB_STORE:
+        return 0
+    try:
+        if not _tables_ready:
+            await asyncio.to_thread(ensure_tables)
+        prepared = _prepare(jobs, career_goal, country)
+        if prepared is None:
+            return 0
+        key, postings, insert_postings, link = prepared
+        async with async_engine.begin() as conn:
+            new_ids = (await conn.execute(insert_postings)).scalars().all()
+            for statement in _new_posting_statements(postings, new_ids):
+                await conn.execute(statement)
+            await conn.execute(link)
+        _recent[key] = (time.time(), frozenset(postings))
+        return len(new_ids)
+    except Exception as e:
+        print(f"[Job store] ⚠️ فشل حفظ الوظائف: {e}")
+        return 0
+
+
+def _top_params(career_goal, country, limit, max_age_days):
+    goal, country = normalize_key(career_goal, country)
+    since = datetime.utcnow() - timedelta(days=max_age_days)
+    return {"goal": goal, "country": country, "since": since, "limit": limit}
+
+
+def top_skills(career_goal, country="us", limit=15,
+               min_postings=JOB_STORE_MIN_POSTINGS, max_age_days=JOB_STORE_MAX_AGE_DAYS):
+    """Most demanded skills in recently seen postings, or None when the store can't answer yet."""
+    if not JOB_STORE:
+        return None
+    params = _top_params(career_goal, country, limit, max_age_days)
+    try:
+        ensure_tables()
+        with engine.connect() as conn:
+            if conn.execute(RECENT_POSTINGS, params).scalar() < min_postings:
+                return None
+            rows = conn.execute(TOP_SKILLS, params).all()
+    except Exception as e:
+        print(f"[Job store] ⚠️ فشل الاستعلام: {e}")
+        return None
+    return [skill for skill, _ in rows] or None
+
+
+async def top_skills_async(career_goal, country="us", limit=15,
+                           min_postings=JOB_STORE_MIN_POSTINGS, max_age_days=JOB_STORE_MAX_AGE_DAYS):
+    if not JOB_STORE:
+        return None
+    params = _top_params(career_goal, country, limit, max_age_days)
+    try:
+        if not _tables_ready:
+            await asyncio.to_thread(ensure_tables)
+        async with async_engine.connect() as conn:
+            if (await conn.execute(RECENT_POSTINGS, params)).scalar() < min_postings:
+                return None
+            rows = (await conn.execute(TOP_SKILLS, params)).all()
+    except Exception as e:
+        print(f"[Job store] ⚠️ فشل الاستعلام: {e}")
+        return None
+    return [skill for skill, _ in rows] or None
+
+
+def reextract(batch_size=1000):
+    """Re-run skill extraction for postings stored with an older taxonomy version."""
+    ensure_tables()
+    done = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(
+                    JobPosting.id, JobPosting.description, JobPosting.country,
+                    func.coalesce(JobPosting.created, JobPosting.ingested_at),
+                )
+                .where(JobPosting.taxonomy_version.is_distinct_from(taxonomy.version))
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            ids = [row[0] for row in rows]
+            old = {job_id: set() for job_id in ids}
+            for job_id, skill in conn.execute(
+                delete(JobPostingSkill).where(JobPostingSkill.posting_id.in_(ids))
+                .returning(JobPostingSkill.posting_id, JobPostingSkill.skill)
+            ):
+                old[job_id].add(skill)
+            new = {job_id: posting_skills(description) for job_id, description, _, _ in rows}
+            skill_rows = _skill_rows(new)
+            if skill_rows:
+                conn.execute(insert(JobPostingSkill).values(skill_rows))
+            # العدادات: نطرح المهارات القديمة ونضيف الجديدة (عدد الوظائف نفسه ما تغير)
+            for statement in (
+                counter_statements(((country, when, old[job_id]) for job_id, _, country, when in rows), -1, False)
+                + counter_statements(((country, when, new[job_id]) for job_id, _, country, when in rows), 1, False)
+            ):
+                conn.execute(statement)
+            conn.execute(
+                update(JobPosting).where(JobPosting.id.in_(ids)).values(taxonomy_version=taxonomy.version)
+            )
+        done += len(rows)
+    with engine.begin() as conn:
+        conn.execute(delete(SkillDemandWeek).where(SkillDemandWeek.postings <= 0))
+    print(f"[Job store] ✅ أعيد استخراج المهارات لـ {done} وظيفة (taxonomy v{taxonomy.version})")
+    return done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query or maintain the local job-postings store")
+    parser.add_argument("career_goal", nargs="?")
+    parser.add_argument("--country", default="us")
+    parser.add_argument("--limit", type=int, default=15)
+    parser.add_argument("--reextract", action="store_true", help="re-extract skills after a taxonomy change")
+    args = parser.parse_args()
+
+    if args.reextract:
+        reextract()
+    if args.career_goal:
+        print(top_skills(args.career_goal, args.country, args.limit, min_postings=1))
@@ -0,0 +1,306 @@
+# llm_cache.py
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import asyncio
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+import metrics
+
+load_dotenv()
+
+# -------------------------------------------
+# ⚙️ إعدادات الكاش
+# -------------------------------------------
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+LLM_CACHE_MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "512"))
+LLM_CACHE_MEMORY_TTL = float(os.getenv("LLM_CACHE_MEMORY_TTL", str(60 * 60)))
+LLM_CACHE_DISK_TTL = float(os.getenv("LLM_CACHE_DISK_TTL", str(7 * 24 * 60 * 60)))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+
+def make_key(model: str, temperature, max_tokens, messages: list) -> str:
+    """Content hash of everything that shapes the completion."""
+    payload = json.dumps(
+        [model, temperature, max_tokens, messages],
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Two-level cache for chat completions: a small in-memory LRU with TTL in
+    front of a SQLite file that survives restarts. The SQLite file is kept
+    under `max_bytes` by dropping the least recently used entries.
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, memory_items=LLM_CACHE_MEMORY_ITEMS,
+                 memory_ttl=LLM_CACHE_MEMORY_TTL, disk_ttl=LLM_CACHE_DISK_TTL,
+                 max_bytes=LLM_CACHE_MAX_BYTES):
+        self.path = path
+        self.memory_items = memory_items
+        self.memory_ttl = memory_ttl
+        self.disk_ttl = disk_ttl
+        self.max_bytes = max_bytes
+
+        self._memory = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()  # الـ LRU بالذاكرة
+        self._disk_lock = threading.Lock()  # اتصال SQLite
+        self._conn = None
+        self._disk_bytes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ---------- SQLite ----------
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)"
+            )
+            self._conn.commit()
+            row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+            self._disk_bytes = row[0]
+        return self._conn
+
+    def _evict_disk(self, conn):
+        # نحذف الأقدم استخداماً لحد ما نرجع لـ 90% من الحد
+        target = int(self.max_bytes * 0.9)
+        while self._disk_bytes > target:
+            rows = conn.execute(
+                "SELECT key, size FROM llm_cache ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._disk_bytes = 0
+                break
+            victims = []
+            for key, size in rows:
+                if self._disk_bytes <= target:
+                    break
+                victims.append((key,))
+                self._disk_bytes -= size
+            conn.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+            self.evictions += len(victims)
+
+    # ---------- memory LRU ----------
+    def _remember(self, key, value, now):
+        self._memory[key] = (now + self.memory_ttl, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    # ---------- public API ----------
+    def get_memory(self, key: str):
+        """In-memory LRU only; never touches SQLite, so it's safe on the event loop."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return value
+            del self._memory[key]
+            return None
+
+    def get_disk(self, key: str):
+        now = time.time()
+        # قفل منفصل للـ SQLite عشان الـ LRU بالذاكرة ما ينتظر الديسك
+        with self._disk_lock:
+            try:
+                conn = self._db()
+                row = conn.execute(
+                    "SELECT value, created FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] + self.disk_ttl > now:
+                    conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                    conn.commit()
+                    with self._lock:
+                        self._remember(key, row[0], now)
+                    self.disk_hits += 1
+                    return row[0]
+            except sqlite3.Error as e:
+                print(f"[LLM cache] ⚠️ SQLite read failed: {e}")
+
+            self.misses += 1
+            return None
+
+    def get(self, key: str):
+        value = self.get_memory(key)
+        if value is not None:
+            return value
+        return self.get_disk(key)
+
+    def set_memory(self, key: str, value: str):
+        with self._lock:
+            self._remember(key, value, time.time())
+
+    def set_disk(self, key: str, value: str):
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._disk_lock:
+            try:
+                conn = self._db()
+                old = conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, size, created, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, now, now),
+                )
+                self._disk_bytes += size - (old[0] if old else 0)
+                if self._disk_bytes > self.max_bytes:
+                    self._evict_disk(conn)
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"[LLM cache] ⚠️ SQLite write failed: {e}")
+
+    def set(self, key: str, value: str):
+        self.set_memory(key, value)
+        self.set_disk(key, value)
+
+    # ---------- async: الذاكرة inline والـ SQLite بـ thread ----------
+    async def get_async(self, key: str):
+        value = self.get_memory(key)
+        if value is not None:
+            return value
+        return await asyncio.to_thread(self.get_disk, key)
+
+    async def set_async(self, key: str, value: str):
+        self.set_memory(key, value)
+        await asyncio.to_thread(self.set_disk, key, value)
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+            "memory_items": len(self._memory),
+            "disk_bytes": self._disk_bytes,
+            "evictions": self.evictions,
+        }
+
+
+cache = LLMCache()
+
+
+# -------------------------------------------
+# 🔹 واجهة موحدة أمام client.chat.completions.create
+# -------------------------------------------
+def cached_chat_completion(client, model: str, messages: list, temperature=None, max_tokens=None) -> str:
+    """Return the completion text, serving identical requests from the cache."""
+    key = make_key(model, temperature, max_tokens, messages)
+    content = cache.get(key)
+    if content is not None:
+        return content
+
+    kwargs = {"model": model, "messages": messages}
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    if max_tokens is not None:
+        kwargs["max_tokens"] = max_tokens
+    try:
+        with metrics.timed("openai"):
+            response = client.chat.completions.create(**kwargs)
+    except Exception as e:
+        metrics.failures.inc("openai", type(e).__name__)
+        raise
+    metrics.record_usage(model, response.usage)
+
+    content = response.choices[0].message.content
+    if content:
+        cache.set(key, content)
+    return content
+
+
+async def cached_chat_completion_async(client, model: str, messages: list, temperature=None, max_tokens=None) -> str:
+    """Async version of cached_chat_completion for AsyncOpenAI clients."""
+    key = make_key(model, temperature, max_tokens, messages)
+    content = await cache.get_async(key)
+    if content is not None:
+        return content
+
+    kwargs = {"model": model, "messages": messages}
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    if max_tokens is not None:
+        kwargs["max_tokens"] = max_tokens
+    try:
+        with metrics.timed("openai"):
+            response = await client.chat.completions.create(**kwargs)
+    except Exception as e:
+        metrics.failures.inc("openai", type(e).__name__)
+        raise
+    metrics.record_usage(model, response.usage)
+
+    content = response.choices[0].message.content
+    if content:
+        await cache.set_async(key, content)
+    return content
+
+
+async def stream_chat_completion_async(client, model: str, messages: list, temperature=None, max_tokens=None):
+    """
+    Streaming variant: yields content deltas as they arrive. A cache hit is
+    yielded as one chunk; a completed stream is stored like a normal call.
+    """
+    key = make_key(model, temperature, max_tokens, messages)
+    content = await cache.get_async(key)
+    if content is not None:
+        yield content
+        return
+
+    # include_usage: آخر chunk فيه عدد الـ tokens (بدون choices)
+    kwargs = {"model": model, "messages": messages, "stream": True, "stream_options": {"include_usage": True}}
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    if max_tokens is not None:
+        kwargs["max_tokens"] = max_tokens
+
+    parts = []
+    start = time.perf_counter()
+    try:
+        stream = await client.chat.completions.create(**kwargs)
+        # async with يسكر اتصال OpenAI حتى لو المستهلك وقف بالنص (timeout / العميل قطع)
+        async with stream:
+            async for chunk in stream:
+                if chunk.usage:
+                    metrics.record_usage(model, chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not parts:
+                        metrics.stage_seconds.observe(time.perf_counter() - start, "openai_first_token")
+                    parts.append(delta)
+                    yield delta
+    except Exception as e:
+        metrics.failures.inc("openai", type(e).__name__)
+        raise
+    metrics.stage_seconds.observe(time.perf_counter() - start, "openai_stream")
+
+    content = "".join(parts)
+    if content:
+        await cache.set_async(key, content)
@@ -1,15 +1,94 @@
 # main.py
-from fastapi import FastAPI, Depends
-from sqlalchemy.orm import Session
+import os
+import json
+import asyncio
+from typing import List, Literal, Optional
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from models import UserProfile
-from courses_fetcher import search_courses
-from recommender import generate_learning_path
+from courses_fetcher import search_courses_async, search_courses_with_embeddings_async
+from recommender import generate_learning_path_async, fetch_market_insight_async, stream_learning_path_async
 # from skills_generator import generate_required_skills
-from skills_generator import generate_combined_skills
-from database import get_db
-
-app = FastAPI(title='Smart Learning Recommender')
+from skills_generator import generate_combined_skills_async
+from database import pool_stats
+from llm_cache import cache as llm_cache
+from adzuna_client import adzuna
+import single_flight
+from search_cache import course_cache, normalize_keywords
+from skill_taxonomy import canonicalize
+import market_insights
+import skill_trends
+import metrics
+from courses_fetcher import COURSE_SEARCH_MODE
+from bm25_index import course_index
+from embedding_search import course_embeddings, profile_text, STORE_RELOAD_INTERVAL
+from embedding_store import EMBEDDING_STORE_PATH
+from ann_index import IVFIndex, ANN_INDEX_PATH
+
+MARKET_INSIGHTS_REFRESH = os.getenv("MARKET_INSIGHTS_REFRESH", "1") == "1"
+BM25_INDEX = os.getenv("BM25_INDEX", "1" if COURSE_SEARCH_MODE == "bm25" else "0") == "1"
+# البحث الدلالي بالـ embeddings بدل الكلمات المفتاحية في /recommend
+SEMANTIC_SEARCH = os.getenv("SEMANTIC_SEARCH", "0") == "1"
+# /recommend/batch: أقصى عدد طلاب في الطلب، وكم عملية (بحث أو GPT) تشتغل بنفس الوقت
+# ?mode=fast: مخطط محلي بدون GPT (fast_planner.py)، llm هو الافتراضي
+PlannerMode = Literal["llm", "fast"]
+RECOMMEND_BATCH_MAX = int(os.getenv("RECOMMEND_BATCH_MAX", "500"))
+RECOMMEND_BATCH_CONCURRENCY = int(os.getenv("RECOMMEND_BATCH_CONCURRENCY", "8"))
+
+
+async def build_course_index():
+    try:
+        await asyncio.to_thread(course_index.build_from_db)
+    except Exception as e:
+        print(f"[BM25] ⚠️ فشل بناء الفهرس: {e}")
+
+
+async def load_course_embeddings():
+    try:
+        # فهرس IVF (لو مبني) يغني عن البحث الكامل على كتالوج كبير
+        if os.path.exists(ANN_INDEX_PATH):
+            course_embeddings.attach_ann(await asyncio.to_thread(IVFIndex.load, ANN_INDEX_PATH), ANN_INDEX_PATH)
+        # الـ store المشترك (mmap) أسرع بكثير من قراءة JSON من Postgres
+        elif os.path.exists(EMBEDDING_STORE_PATH):
+            course_embeddings.load_store(EMBEDDING_STORE_PATH)
+        else:
+            await asyncio.to_thread(course_embeddings.load_from_db)
+    except Exception as e:
+        print(f"[Embeddings] ⚠️ فشل تحميل الـ embeddings: {e}")
+        return
+
+    # snapshot جديد (embedding_store.py / ann_index.py sync) يتحمل بـ thread، مش بمسار الطلب
+    while True:
+        await asyncio.sleep(STORE_RELOAD_INTERVAL)
+        try:
+            await asyncio.to_thread(course_embeddings.reload_if_changed)
+        except Exception as e:
+            print(f"[Embeddings] ⚠️ فشل فحص الـ snapshot: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # تحديث market insights بالخلفية لأشهر الأهداف المهنية
+    # نحتفظ بمرجع لكل task، وإلا الـ event loop ممكن يرميها للـ GC قبل ما تخلص
+    tasks = []
+    if MARKET_INSIGHTS_REFRESH:
+        tasks.append(asyncio.create_task(market_insights.run_forever()))
+    # فهرس BM25 للكورسات (البحث يرجع لـ ilike لحد ما يخلص)
+    if BM25_INDEX:
+        tasks.append(asyncio.create_task(build_course_index()))
+    if SEMANTIC_SEARCH:
+        tasks.append(asyncio.create_task(load_course_embeddings()))
+    yield
+    for task in tasks:
+        task.cancel()
+
+
+app = FastAPI(title='Smart Learning Recommender', lifespan=lifespan)
+
+# توقيت كل طلب حسب الـ route (GET /metrics)
+app.add_middleware(metrics.MetricsMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,39 +102,229 @@ app.add_middleware(
 def health_check():
     return {"status": "healthy", "message": "Smart Learning Recommender API is running"}
 
+@app.get("/cache-stats")
+def cache_stats():
+    return {
+        "llm": llm_cache.stats(),
+        "adzuna": adzuna.stats(),
+        "bm25": course_index.stats(),
+        "courses": course_cache.stats(),
+        "single_flight": single_flight.stats(),
+    }
+
+@app.get("/pool-stats")
+def db_pool_stats():
+    return pool_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus text format: stage latency histograms, upstream failures, OpenAI tokens."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/skill-trends")
+async def get_skill_trends(career_goal: Optional[str] = None, country: str = "us", limit: int = 10):
+    """Top rising and declining skills (share of postings, last weeks vs the weeks before)."""
+    try:
+        result = await skill_trends.trends_async(career_goal, country, limit)
+    except Exception as e:
+        print(f"[Skill trends] ⚠️ {e}")
+        result = {"risers": [], "decliners": []}
+    return {"career_goal": career_goal, "country": country, "weeks": skill_trends.TREND_WINDOW_WEEKS, **result}
+
 @app.post("/generate-skills")
-def generate_skills(user: UserProfile):
+async def generate_skills(user: UserProfile):
     """Generate relevant skills for the given specialization & career goal"""
     if not user.major or not user.career_goal:
         return {"error": "Major and career_goal are required to generate skills"}
-    skills = generate_combined_skills(user.major, user.career_goal)
+    skills, dropped = await generate_combined_skills_async(user.major, user.career_goal)
     # skills = generate_required_skills(user.major, user.career_goal)
 
-    return {"skills": skills}
+    return {"skills": skills, "dropped_branches": dropped}
 
-@app.post("/recommend")
-def recommend(user: UserProfile, db: Session = Depends(get_db)):
+def canonical_profile(user: UserProfile) -> UserProfile:
+    """Same profile with skills canonicalized ("python", "Python 3" -> "Python"), see skill_taxonomy.py."""
+    return user.model_copy(update={"skills": canonicalize(user.skills)})
+
+def build_keywords(user: UserProfile):
     keywords = []
     if user.college: keywords.append(user.college)
     if user.department: keywords.append(user.department)
     if user.major: keywords.append(user.major)
-    if user.skills: keywords.extend(user.skills)
+    if user.skills: keywords.extend(canonicalize(user.skills))
     # if user.interests: keywords.extend(user.interests)
     if user.career_goal: keywords.append(user.career_goal)
+    # بدون تكرار عشان سلسلة الـ ILIKE ما تطول على الفاضي
+    seen = set()
+    return [k for k in keywords if not (k.casefold() in seen or seen.add(k.casefold()))]
 
-    courses = search_courses(keywords, limit=30)
+async def find_courses(user: UserProfile, keywords: list, limit=30):
+    with metrics.timed("course_search"):
+        if SEMANTIC_SEARCH and course_embeddings.ready:
+            return await search_courses_with_embeddings_async(user.dict(), limit=limit)
+        return await search_courses_async(keywords, limit=limit)
+
+@app.post("/recommend")
+async def recommend(user: UserProfile, mode: Optional[PlannerMode] = None):
+    user = canonical_profile(user)
+    keywords = build_keywords(user)
+
+    # البحث عن الكورسات وتحليل سوق العمل بالتوازي
+    courses, high_demand = await asyncio.gather(
+        find_courses(user, keywords, limit=30),
+        fetch_market_insight_async(user.career_goal),
+    )
     if not courses:
         return {"error": "No courses found for this profile"}
 
     courses_data = [dict(c) for c in courses]
 
-    learning_path = generate_learning_path(user.dict(), courses_data)
+    learning_path = await generate_learning_path_async(user.dict(), courses_data, high_demand, mode=mode)
     return {
         "user_profile": user.dict(),
         "recommended_courses": courses_data,
         "learning_path": learning_path,
     }
 
+def course_search_key(user: UserProfile, keywords: list):
+    """Profiles with the same key get the same courses from find_courses."""
+    if SEMANTIC_SEARCH and course_embeddings.ready:
+        return ("semantic", profile_text(user.dict()))
+    # كل أوضاع البحث ما تفرق بين الحروف الكبيرة والصغيرة ولا بترتيب الكلمات
+    return ("keywords", normalize_keywords(keywords))
+
+@app.post("/recommend/batch")
+async def recommend_batch(users: List[UserProfile], mode: Optional[PlannerMode] = None):
+    """
+    Recommendations for a whole cohort. Each distinct course search, market
+    lookup and learning path runs once and is shared by every student that
+    needs it; results keep the input order with a per-item `error`.
+    """
+    if len(users) > RECOMMEND_BATCH_MAX:
+        return {"error": f"At most {RECOMMEND_BATCH_MAX} profiles per batch"}
+
+    limiter = asyncio.Semaphore(RECOMMEND_BATCH_CONCURRENCY)
+
+    async def limited(coro):
+        async with limiter:
+            return await coro
+
+    users = [canonical_profile(user) for user in users]
+    keywords = [build_keywords(user) for user in users]
+    search_keys = [course_search_key(user, kw) for user, kw in zip(users, keywords)]
+    goal_keys = [market_insights.normalize_key(user.career_goal)[0] for user in users]
+
+    # بحث واحد لكل مجموعة كلمات، وتحليل سوق واحد لكل هدف مهني
+    search_users = {}
+    for i, key in enumerate(search_keys):
+        search_users.setdefault(key, i)
+    goal_users = {}
+    for i, key in enumerate(goal_keys):
+        if key in goal_users:
+            # نحسب الطلب للـ materializer حتى لو ما سوينا lookup
+            market_insights.record_request(users[i].career_goal)
+        goal_users.setdefault(key, i)
+
+    # البحث عن الكورسات و market insights مستقلين: gather واحد، والاثنين تحت نفس الـ limited
+    outcomes = await asyncio.gather(
+        *(limited(find_courses(users[i], keywords[i], limit=30)) for i in search_users.values()),
+        *(limited(fetch_market_insight_async(users[i].career_goal)) for i in goal_users.values()),
+        return_exceptions=True,
+    )
+    search_results = outcomes[:len(search_users)]
+    # fetch_market_insight_async ما يرمي (يرجع [] عند الفشل)، بس للاحتياط
+    goal_results = [[] if isinstance(r, Exception) else r for r in outcomes[len(search_users):]]
+    courses_by_key = dict(zip(search_users, search_results))
+    demand_by_goal = dict(zip(goal_users, goal_results))
+
+    # الطلاب اللي بروفايلهم متطابق ياخذوا نفس المسار
+    path_users = {}
+    for i, user in enumerate(users):
+        courses = courses_by_key[search_keys[i]]
+        if courses and not isinstance(courses, Exception):
+            path_users.setdefault(json.dumps(user.dict(), sort_keys=True), i)
+
+    async def build_path(i):
+        courses_data = [dict(c) for c in courses_by_key[search_keys[i]]]
+        path = await generate_learning_path_async(
+            users[i].dict(), courses_data, demand_by_goal[goal_keys[i]], mode=mode
+        )
+        return courses_data, path
+
+    path_results = await asyncio.gather(
+        *(limited(build_path(i)) for i in path_users.values()),
+        return_exceptions=True,
+    )
+    paths_by_profile = dict(zip(path_users, path_results))
+
+    results = []
+    for i, user in enumerate(users):
+        item = {"user_profile": user.dict(), "recommended_courses": [], "learning_path": "[]", "error": None}
+        courses = courses_by_key[search_keys[i]]
+        if isinstance(courses, Exception):
+            print(f"[Batch] ⚠️ course search failed: {courses}")
+            item["error"] = "Course search failed"
+        elif not courses:
+            item["error"] = "No courses found for this profile"
+        else:
+            outcome = paths_by_profile[json.dumps(user.dict(), sort_keys=True)]
+            if isinstance(outcome, Exception):
+                print(f"[Batch] ⚠️ learning path failed: {outcome}")
+                item["error"] = "Failed to generate learning path"
+            else:
+                item["recommended_courses"], item["learning_path"] = outcome
+        results.append(item)
+
+    return {
+        "results": results,
+        "stats": {
+            "users": len(users),
+            "course_searches": len(search_users),
+            "market_lookups": len(goal_users),
+            "learning_paths": len(path_users),
+        },
+    }
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.post("/recommend/stream")
+async def recommend_stream(user: UserProfile, mode: Optional[PlannerMode] = None):
+    """
+    Server-sent events: `courses` as soon as the search finishes, then one
+    `step` event per learning-path step while GPT is still writing, then `done`.
+    """
+    user = canonical_profile(user)
+    keywords = build_keywords(user)
+    # تحليل السوق يشتغل بالتوازي مع البحث وما نستناه قبل إرسال الكورسات
+    market_task = asyncio.create_task(fetch_market_insight_async(user.career_goal))
+
+    async def events():
+        try:
+            courses = await find_courses(user, keywords, limit=30)
+            if not courses:
+                yield sse_event("error", {"error": "No courses found for this profile"})
+                return
+            courses_data = [dict(c) for c in courses]
+            yield sse_event("courses", courses_data)
+
+            high_demand = await market_task
+            steps = 0
+            async for step in stream_learning_path_async(user.dict(), courses_data, high_demand, mode=mode):
+                steps += 1
+                yield sse_event("step", step)
+            yield sse_event("done", {"steps": steps})
+        except Exception as e:
+            print("Error streaming learning path:", str(e))
+            yield sse_event("error", {"error": "Failed to generate learning path"})
+        finally:
+            market_task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 #----------------------------------------------1---------------
 
 # from fastapi import FastAPI, Depends
@@ -0,0 +1,179 @@
+# market_insights.py
+import os
+import json
+import time
+import asyncio
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import select, update, text
+from sqlalchemy.dialects.postgresql import insert
+from database import engine, SessionLocal
+from models import MarketInsight
+from job_market import get_high_demand_skills
+from job_store import normalize_key
+
+load_dotenv()
+
+# -------------------------------------------
+# ⚙️ إعدادات
+# -------------------------------------------
+MARKET_INSIGHTS_TOP_N = int(os.getenv("MARKET_INSIGHTS_TOP_N", "50"))
+MARKET_INSIGHTS_INTERVAL = float(os.getenv("MARKET_INSIGHTS_INTERVAL", str(60 * 60)))
+# التحديث بالخلفية يقدر يجيب أكثر من صفحة (الـ harvester يوقف لحاله لما تقل المهارات الجديدة)
+MARKET_INSIGHTS_PAGES = int(os.getenv("MARKET_INSIGHTS_PAGES", "5"))
+# advisory lock بـ Postgres: worker واحد بس يعمل التحديث، الباقي يحمّلوا الـ snapshot
+MARKET_INSIGHTS_LOCK_ID = int(os.getenv("MARKET_INSIGHTS_LOCK_ID", "5315001"))
+
+# snapshot في الذاكرة: (career_goal, country) -> skills
+# يتم استبداله كامل عند كل تحميل، فالقراءة ما تحتاج lock
+_snapshot = {}
+_pending_hits = Counter()
+_hits_lock = threading.Lock()
+
+
+# -------------------------------------------
+# 🔹 القراءة من المسار الساخن
+# -------------------------------------------
+def record_request(career_goal, country="us"):
+    key = normalize_key(career_goal, country)
+    if not key[0]:
+        return
+    with _hits_lock:
+        _pending_hits[key] += 1
+
+
+def lookup(career_goal, country="us"):
+    """Materialized high-demand skills for the pair, or None on a miss."""
+    record_request(career_goal, country)
+    return _snapshot.get(normalize_key(career_goal, country))
+
+
+# -------------------------------------------
+# 🔹 الـ materializer
+# -------------------------------------------
+def ensure_table():
+    MarketInsight.__table__.create(bind=engine, checkfirst=True)
+
+
+def flush_hits():
+    """Add the hits counted in this process to the market_insights table."""
+    with _hits_lock:
+        pending = dict(_pending_hits)
+        _pending_hits.clear()
+    if not pending:
+        return
+
+    rows = [
+        {"career_goal": goal, "country": country, "hits": hits}
+        for (goal, country), hits in pending.items()
+    ]
+    stmt = insert(MarketInsight).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[MarketInsight.career_goal, MarketInsight.country],
+        set_={"hits": MarketInsight.hits + stmt.excluded.hits},
+    )
+    with engine.begin() as conn:
+        conn.execute(stmt)
+
+
+def refresh_top(top_n=MARKET_INSIGHTS_TOP_N, max_age=MARKET_INSIGHTS_INTERVAL):
+    """
+    Re-fetch skills for the top N pairs whose snapshot is older than max_age.
+    Only the process holding the advisory lock refreshes; the others skip
+    (returns None) and pick the result up in load_snapshot.
+    """
+    with engine.connect() as lock_conn:
+        leader = lock_conn.execute(
+            text("SELECT pg_try_advisory_lock(:id)"), {"id": MARKET_INSIGHTS_LOCK_ID}
+        ).scalar()
+        if not leader:
+            print("[Market insights] ⏭️ worker ثاني يعمل التحديث")
+            return None
+        try:
+            return _refresh_top(top_n, max_age)
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MARKET_INSIGHTS_LOCK_ID})
+
+
+def _refresh_top(top_n, max_age):
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+    # نقرأ القائمة ونرجع الاتصال للـ pool قبل الـ harvest الطويل
+    with engine.connect() as conn:
+        top = conn.execute(
+            select(MarketInsight.career_goal, MarketInsight.country, MarketInsight.refreshed_at)
+            .order_by(MarketInsight.hits.desc())
+            .limit(top_n)
+        ).all()
+
+    refreshed = 0
+    for goal, country, refreshed_at in top:
+        if refreshed_at and refreshed_at > cutoff:
+            continue
+        skills = get_high_demand_skills(
+            country=country, keyword=goal, pages=MARKET_INSIGHTS_PAGES, refresh=True,
+        )
+        if not skills:
+            continue
+        # transaction قصيرة لكل هدف
+        with engine.begin() as conn:
+            conn.execute(
+                update(MarketInsight)
+                .where(MarketInsight.career_goal == goal, MarketInsight.country == country)
+                .values(skills=json.dumps(skills, ensure_ascii=False), refreshed_at=datetime.utcnow())
+            )
+        refreshed += 1
+
+    print(f"[Market insights] ✅ تم تحديث {refreshed} من أصل {len(top)}")
+    return refreshed
+
+
+def load_snapshot(top_n=MARKET_INSIGHTS_TOP_N):
+    global _snapshot
+    with SessionLocal() as db:
+        rows = db.execute(
+            select(MarketInsight.career_goal, MarketInsight.country, MarketInsight.skills)
+            .where(MarketInsight.skills.isnot(None))
+            .order_by(MarketInsight.hits.desc())
+            .limit(top_n)
+        ).all()
+    _snapshot = {(goal, country): json.loads(skills) for goal, country, skills in rows}
+    return len(_snapshot)
+
+
+def refresh_once(top_n=MARKET_INSIGHTS_TOP_N, max_age=MARKET_INSIGHTS_INTERVAL):
+    ensure_table()
+    flush_hits()
+    refresh_top(top_n, max_age)
+    return load_snapshot(top_n)
+
+
+async def run_forever(top_n=MARKET_INSIGHTS_TOP_N, interval=MARKET_INSIGHTS_INTERVAL):
+    """Background loop started from the FastAPI lifespan."""
+    while True:
+        try:
+            await asyncio.to_thread(refresh_once, top_n, interval)
+        except Exception as e:
+            print(f"[Market insights] ⚠️ فشل التحديث: {e}")
+        await asyncio.sleep(interval)
+
+
+# -------------------------------------------
+# ✅ تشغيل من سطر الأوامر
+# -------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh materialized market insights")
+    parser.add_argument("--top", type=int, default=MARKET_INSIGHTS_TOP_N)
+    parser.add_argument("--interval", type=float, default=MARKET_INSIGHTS_INTERVAL)
+    parser.add_argument("--loop", action="store_true", help="keep refreshing every --interval seconds")
+    args = parser.parse_args()
+
+    while True:
+        start = time.time()
+        loaded = refresh_once(args.top, args.interval)
+        print(f"[Market insights] {loaded} entries in snapshot ({time.time() - start:.1f}s)")
+        if not args.loop:
+            break
+        time.sleep(args.interval)
@@ -0,0 +1,240 @@
+# metrics.py
+"""
+In-process Prometheus metrics: per-stage latency histograms and upstream
+failure counters, rendered in the text exposition format by GET /metrics.
+
+Recording takes no lock: each thread gets its own shard (a plain list of
+bucket counts plus the sum) the first time it touches a series, and a
+scrape adds the shards up. When a thread ends its shard is folded into a
+per-series retired total, so short-lived threads don't pile up shards.
+Locks are only taken when a new label set or a new thread shows up, when
+a thread ends, and while rendering, so observing costs about a
+microsecond.
+
+    with metrics.timed("adzuna_http"):
+        ...
+    metrics.failures.inc("adzuna", "429")
+"""
+import os
+import time
+import bisect
+import weakref
+import threading
+
+METRICS = os.getenv("METRICS", "1") == "1"
+
+# ثواني: من استعلام DB سريع لحد نداء GPT طويل
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REGISTRY = []
+
+
+class _ThreadToken:
+    """Owned only by one thread's threading.local; collected when the thread ends."""
+    __slots__ = ("__weakref__",)
+
+
+class _Series:
+    """One label combination; per-thread shards of equal-length count lists."""
+
+    def __init__(self, size):
+        self.size = size
+        self._local = threading.local()
+        self._shards = {}  # id(shard) -> shard، للـ threads الحية بس
+        self._retired = [0] * size  # مجموع shards الـ threads اللي انتهت
+        self._lock = threading.Lock()
+
+    def shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = [0] * self.size
+            token = _ThreadToken()
+            with self._lock:
+                self._shards[id(shard)] = shard
+            # لما ينتهي الـ thread يختفي الـ token، فندمج الـ shard بالمجموع ونشيله
+            weakref.finalize(token, self._retire, shard)
+            self._local.shard = shard
+            self._local.token = token
+            return shard
+
+    def _retire(self, shard):
+        with self._lock:
+            if self._shards.pop(id(shard), None) is None:
+                return
+            for i, value in enumerate(shard):
+                self._retired[i] += value
+
+    def total(self):
+        with self._lock:
+            shards = list(self._shards.values())
+            totals = list(self._retired)
+        for shard in shards:
+            for i, value in enumerate(shard):
+                totals[i] += value
+        return totals
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _size(self):
+        raise NotImplementedError
+
+    def series(self, labels):
+        series = self._series.get(labels)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(labels, _Series(self._size()))
+        return series
+
+    def _labels(self, labels, extra=""):
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for labels, series in items:
+            lines.extend(self._render_series(labels, series.total()))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _size(self):
+        return 1
+
+    def inc(self, *labels, amount=1):
+        if METRICS:
+            self.series(labels).shard()[0] += amount
+
+    def _render_series(self, labels, totals):
+        return [f"{self.name}{self._labels(labels)} {_number(totals[0])}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames)
+
+    def _size(self):
+        # عدد لكل bucket + خانة +Inf + المجموع
+        return len(self.buckets) + 2
+
+    def observe(self, value, *labels):
+        if not METRICS:
+            return
+        shard = self.series(labels).shard()
+        shard[bisect.bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    def _render_series(self, labels, totals):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, totals):
+            cumulative += count
+            le = 'le="%s"' % _number(bound)
+            lines.append(f"{self.name}_bucket{self._labels(labels, le)} {cumulative}")
+        cumulative += totals[len(self.buckets)]
+        le = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{self._labels(labels, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{self._labels(labels)} {_number(totals[-1])}")
+        lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# -------------------------------------------
+# 🔹 المقاييس المشتركة
+# -------------------------------------------
+stage_seconds = Histogram(
+    "recommender_stage_seconds",
+    "Time spent per stage (db_query, adzuna_http, openai, json_parse, ...).",
+    ("stage",),
+)
+failures = Counter(
+    "recommender_upstream_failures_total",
+    "Failed calls to upstream services by reason.",
+    ("upstream", "reason"),
+)
+openai_tokens = Counter(
+    "recommender_openai_tokens_total",
+    "Tokens used by OpenAI completions (cache misses only).",
+    ("model", "type"),
+)
+request_seconds = Histogram(
+    "recommender_http_request_seconds",
+    "End-to-end HTTP request latency by route.",
+    ("method", "route"),
+)
+
+
+class timed:
+    """Context manager observing the block's wall time into stage_seconds."""
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        stage_seconds.observe(time.perf_counter() - self.start, self.stage)
+        return False
+
+
+def record_usage(model, usage):
+    """Token counts from an OpenAI response.usage object (None is fine)."""
+    if usage is None:
+        return
+    openai_tokens.inc(model, "prompt", amount=usage.prompt_tokens or 0)
+    openai_tokens.inc(model, "completion", amount=usage.completion_tokens or 0)
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware (no BaseHTTPMiddleware), so streaming responses aren't buffered."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # الـ route template (/recommend) مش الـ path الخام، عشان عدد السلاسل يبقى محدود
+            route = getattr(scope.get("route"), "path", "unmatched")
+            request_seconds.observe(time.perf_counter() - start, scope["method"], route)
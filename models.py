@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, Date
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Text, Computed, Index, ForeignKey, func
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from database import Base
 from pydantic import BaseModel
 from typing import List, Optional
@@ -18,6 +19,92 @@ class Course(Base):
     duration = Column(String)
     instructors_id = Column(String)
     image = Column(String)
+    # generated by Postgres, used by the "fts" search mode (see db_bootstrap.py)
+    title_tsv = Column(TSVECTOR, Computed("to_tsvector('english', coalesce(title, ''))", persisted=True))
+    # JSON array of floats (pgvector columns work too), see embedding_search.py
+    embedding = Column(Text)
+    # last_update_date the embedding was computed from, see embed_courses.py
+    embedded_update_date = Column(Date)
+    # bumped by a trigger when embedding/rating/num_reviews change, see db_bootstrap.py
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    __table_args__ = (
+        Index("ix_courses_title_tsv", "title_tsv", postgresql_using="gin"),
+        # needs the pg_trgm extension, used by the "trgm" search mode
+        Index("ix_courses_title_trgm", "title", postgresql_using="gin",
+              postgresql_ops={"title": "gin_trgm_ops"}),
+    )
+
+
+# Materialized market insight per (career_goal, country), see market_insights.py
+class MarketInsight(Base):
+    __tablename__ = "market_insights"
+
+    career_goal = Column(String, primary_key=True)
+    country = Column(String, primary_key=True)
+    skills = Column(Text)  # JSON list of high-demand skills
+    hits = Column(Integer, nullable=False, default=0)
+    refreshed_at = Column(DateTime)
+
+
+# Adzuna postings kept across refreshes, see job_store.py
+class JobPosting(Base):
+    __tablename__ = "job_postings"
+
+    id = Column(String, primary_key=True)  # Adzuna job id
+    country = Column(String, nullable=False)
+    title = Column(String)
+    company = Column(String)
+    description = Column(Text)
+    created = Column(DateTime)  # posting date reported by Adzuna
+    ingested_at = Column(DateTime, nullable=False)
+    taxonomy_version = Column(Integer)  # skill_taxonomy version the skills were extracted with
+
+
+# which (career_goal, country) searches returned a posting, and when we last saw it there
+class JobPostingSearch(Base):
+    __tablename__ = "job_posting_searches"
+
+    career_goal = Column(String, primary_key=True)
+    country = Column(String, primary_key=True)
+    posting_id = Column(String, ForeignKey("job_postings.id", ondelete="CASCADE"), primary_key=True)
+    seen_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_job_posting_searches_seen", "career_goal", "country", "seen_at"),
+    )
+
+
+# canonical skills mentioned by a posting (one row per skill)
+class JobPostingSkill(Base):
+    __tablename__ = "job_posting_skills"
+
+    posting_id = Column(String, ForeignKey("job_postings.id", ondelete="CASCADE"), primary_key=True)
+    skill = Column(String, primary_key=True)
+
+    __table_args__ = (
+        Index("ix_job_posting_skills_skill", "skill"),
+    )
+
+
+# weekly demand counters, updated as postings are ingested (see skill_trends.py);
+# sparse: only (country, skill, week) triples that actually occurred
+class SkillDemandWeek(Base):
+    __tablename__ = "skill_demand_weekly"
+
+    country = Column(String, primary_key=True)
+    skill = Column(String, primary_key=True)
+    week = Column(Date, primary_key=True)  # Monday of the posting's week
+    postings = Column(Integer, nullable=False, default=0)
+
+
+# all ingested postings per (country, week), the denominator for demand shares
+class JobPostingWeek(Base):
+    __tablename__ = "job_posting_weekly"
+
+    country = Column(String, primary_key=True)
+    week = Column(Date, primary_key=True)
+    postings = Column(Integer, nullable=False, default=0)
 
 
 # User profile model
@@ -1,9 +1,18 @@
 # recommender.py
 import os
 import json
+import time
+import asyncio
+from contextlib import aclosing
 from dotenv import load_dotenv
-from openai import OpenAI
-from job_market import get_high_demand_skills  # optional
+from llm_cache import cached_chat_completion, cached_chat_completion_async, stream_chat_completion_async
+from openai import OpenAI, AsyncOpenAI
+from job_market import get_high_demand_skills, get_high_demand_skills_async  # optional
+import market_insights
+import skill_trends
+from skill_taxonomy import canonicalize
+from fast_planner import plan_learning_path
+import metrics
 
 load_dotenv()
 
@@ -12,20 +21,54 @@ if not OPENAI_API_KEY:
     raise RuntimeError("OPENAI_API_KEY not set in .env")
 
 client = OpenAI(api_key=OPENAI_API_KEY)
+async_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
 
+# "compact": الكورسات ترسل كأرقام والسيرفر يرجع الـ url/image/duration بنفسه
+LEARNING_PATH_PROMPT = os.getenv("LEARNING_PATH_PROMPT", "full")
+# بعد هالمهلة (ثواني) نرجع لمخطط fast_planner بدل ما ننتظر GPT
+LEARNING_PATH_TIMEOUT = float(os.getenv("LEARNING_PATH_TIMEOUT", "20"))
+# بالـ stream: بعد أول خطوة، أقصى انتظار بين خطوة والثانية
+LEARNING_PATH_IDLE_TIMEOUT = float(os.getenv("LEARNING_PATH_IDLE_TIMEOUT", "30"))
+# اتجاه الطلب (rising / declining) من عدادات skill_trends، بدون أي نداء خارجي
+LEARNING_PATH_TRENDS = os.getenv("LEARNING_PATH_TRENDS", "1") == "1"
 
-def generate_learning_path(user_data: dict, courses: list):
+
+def _trend_directions(high_demand):
+    if not LEARNING_PATH_TRENDS or not high_demand:
+        return None
+    return skill_trends.directions(canonicalize(high_demand))
+
+
+async def _trend_directions_async(high_demand):
+    if not LEARNING_PATH_TRENDS or not high_demand:
+        return None
+    return await skill_trends.directions_async(canonicalize(high_demand))
+
+
+def _trend_line(trends) -> str:
+    """'rising: Rust, dbt; declining: jQuery', or '' when there is nothing to say."""
+    if not trends:
+        return ""
+    parts = []
+    if trends.get("rising"):
+        parts.append("rising: " + ", ".join(trends["rising"]))
+    if trends.get("declining"):
+        parts.append("declining: " + ", ".join(trends["declining"]))
+    return "; ".join(parts)
+
+
+def _build_prompt(user_data: dict, courses: list, high_demand, trends=None):
     course_list = "\n".join([
         f"- {c['title']} ({c['url']}) ⭐ {c.get('rating', 'N/A')} | image: {c.get('image', '')}"
         for c in courses
     ])
+    trend = _trend_line(trends)
+    trend_note = (
+        f"Demand trend (last {skill_trends.TREND_WINDOW_WEEKS} weeks vs the {skill_trends.TREND_WINDOW_WEEKS} before) - "
+        f"{trend}. Favor rising skills when courses are otherwise comparable."
+    ) if trend else ""
 
-    try:
-        high_demand = get_high_demand_skills(keyword=user_data.get("career_goal"))
-    except Exception:
-        high_demand = []
-
-    prompt = f"""
+    return f"""
     You are an AI assistant specialized in creating **personalized learning paths**.
     Analyze the user profile and course data, then generate a **structured roadmap**.
 
@@ -39,6 +82,7 @@ def generate_learning_path(user_data: dict, courses: list):
     ## Market Insight
     High-demand skills in the current job market:
     {high_demand}
+    {trend_note}
 
     ## Available Courses
     {course_list}
@@ -63,23 +107,294 @@ def generate_learning_path(user_data: dict, courses: list):
     ]
     """
 
+
+def _build_compact_prompt(user_data: dict, courses: list, high_demand, trends=None):
+    # فقط اللي يحتاجه النموذج للترتيب، والـ handle هو رقم الكورس في القائمة
+    course_list = "\n".join(
+        f"{i}|{c['title']}|{c.get('rating') or '-'}|{c.get('duration') or '-'}"
+        for i, c in enumerate(courses, 1)
+    )
+
+    return f"""
+    Build a personalized learning path (Beginner → Advanced) from the courses below.
+    User: {user_data.get('major')} ({user_data.get('department')}, {user_data.get('college')})
+    Already knows: {user_data.get('skills')}
+    Career goal: {user_data.get('career_goal')}
+    In-demand skills: {high_demand}
+    {_trend_line(trends) and "Demand trend - " + _trend_line(trends)}
+
+    Courses (id|title|rating|duration):
+    {course_list}
+
+    Pick the most relevant courses for the goal, missing skills and market demand;
+    skip skills the user already knows. Return valid JSON only:
+    [{{"step": 1, "course": <id>, "duration": "X hours", "notes": "why it matters"}}]
+    Estimate duration when it is "-" (3h beginner, 6h intermediate, 10h advanced).
+    """
+
+
+def _completion_args(user_data: dict, courses: list, high_demand, trends=None):
+    if LEARNING_PATH_PROMPT == "compact":
+        prompt = _build_compact_prompt(user_data, courses, high_demand, trends)
+        max_tokens = 700
+    else:
+        prompt = _build_prompt(user_data, courses, high_demand, trends)
+        max_tokens = 1500
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.5,
+        "max_tokens": max_tokens,
+    }
+
+
+def rehydrate_step(step: dict, courses: list):
+    """Replace a compact step's course handle with the real course fields (None if unknown)."""
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.5,
-            max_tokens=1500
-        )
-        # نحاول نحلل JSON بشكل آمن
-        return response.choices[0].message.content
+        handle = int(step.get("course"))
+    except (TypeError, ValueError):
+        return None
+    if not 1 <= handle <= len(courses):
+        return None
+    course = courses[handle - 1]
+    return {
+        "step": step.get("step"),
+        "title": course["title"],
+        "url": course["url"],
+        "duration": course.get("duration") or step.get("duration"),
+        "notes": step.get("notes", ""),
+        "image": course.get("image") or "",
+    }
+
+
+def _as_json(steps: list) -> str:
+    return json.dumps(steps, ensure_ascii=False, default=str)
+
+
+def _finish(content, courses: list):
+    """
+    GPT text -> the learning_path value of /recommend: a JSON array string in
+    every mode (full mode passes GPT's own text through unchanged). None
+    when no usable step came back.
+    """
+    with metrics.timed("json_parse"):
+        steps = StepStreamParser().feed(content or "")
+    if LEARNING_PATH_PROMPT != "compact":
+        return content if steps else None
+    steps = [rehydrate_step(step, courses) for step in steps]
+    steps = [step for step in steps if step is not None]
+    # نعيد الترقيم بعد حذف الخطوات اللي رقمها غير موجود
+    for number, step in enumerate(steps, 1):
+        step["step"] = number
+    return _as_json(steps) if steps else None
+
+
+def _fallback_steps(user_data: dict, courses: list, high_demand, reason):
+    print(f"⚠️ Learning path falls back to the local planner ({reason}).")
+    metrics.failures.inc("learning_path", "fallback")
+    return plan_learning_path(user_data, courses, high_demand)
+
+
+def _fallback_path(user_data: dict, courses: list, high_demand, reason):
+    # نفس النوع في كل المسارات (GPT / fast / fallback): نص JSON زي رد GPT
+    return _as_json(_fallback_steps(user_data, courses, high_demand, reason))
+
+
+def generate_learning_path(user_data: dict, courses: list, mode=None):
+    with metrics.timed("learning_path"):
+        return _generate_learning_path(user_data, courses, mode)
+
+
+def _generate_learning_path(user_data: dict, courses: list, mode=None):
+    # أولاً من الـ snapshot الجاهز، وإذا مش موجود نجيب مباشرة
+    high_demand = market_insights.lookup(user_data.get("career_goal"))
+    if high_demand is None:
+        try:
+            high_demand = get_high_demand_skills(keyword=user_data.get("career_goal"))
+        except Exception:
+            high_demand = []
+
+    if mode == "fast":
+        return _as_json(plan_learning_path(user_data, courses, high_demand))
+
+    try:
+        trends = _trend_directions(high_demand)
+        content = cached_chat_completion(client, **_completion_args(user_data, courses, high_demand, trends))
+        path = _finish(content, courses)
+        if path:
+            return path
+        return _fallback_path(user_data, courses, high_demand, "empty GPT output")
 
-    except json.JSONDecodeError:
-        print("⚠️ Warning: GPT output is not valid JSON.")
-        return []
     except Exception as e:
         print("Error generating learning path:", str(e))
+        return _fallback_path(user_data, courses, high_demand, type(e).__name__)
+
+
+async def fetch_market_insight_async(career_goal):
+    """High-demand skills for the career goal, [] on any failure."""
+    with metrics.timed("market_insight"):
+        return await _fetch_market_insight_async(career_goal)
+
+
+async def _fetch_market_insight_async(career_goal):
+    high_demand = market_insights.lookup(career_goal)
+    if high_demand is not None:
+        return high_demand
+    try:
+        return await get_high_demand_skills_async(keyword=career_goal)
+    except Exception:
         return []
 
+
+async def generate_learning_path_async(user_data: dict, courses: list, high_demand=None, mode=None):
+    """
+    Async version of generate_learning_path. Pass `high_demand` when the
+    market lookup already ran (e.g. concurrently with the course search).
+    mode="fast" skips GPT and uses the local planner.
+    """
+    with metrics.timed("learning_path"):
+        return await _generate_learning_path_async(user_data, courses, high_demand, mode)
+
+
+async def _generate_learning_path_async(user_data: dict, courses: list, high_demand=None, mode=None):
+    if high_demand is None:
+        high_demand = await fetch_market_insight_async(user_data.get("career_goal"))
+
+    if mode == "fast":
+        return _as_json(plan_learning_path(user_data, courses, high_demand))
+
+    try:
+        trends = await _trend_directions_async(high_demand)
+        content = await asyncio.wait_for(
+            cached_chat_completion_async(async_client, **_completion_args(user_data, courses, high_demand, trends)),
+            LEARNING_PATH_TIMEOUT,
+        )
+        path = _finish(content, courses)
+        if path:
+            return path
+        return _fallback_path(user_data, courses, high_demand, "empty GPT output")
+
+    except asyncio.TimeoutError:
+        return _fallback_path(user_data, courses, high_demand, f"timeout after {LEARNING_PATH_TIMEOUT}s")
+    except Exception as e:
+        print("Error generating learning path:", str(e))
+        return _fallback_path(user_data, courses, high_demand, type(e).__name__)
+
+
+class StepStreamParser:
+    """
+    Incremental parser for the learning-path JSON array. Feed it text chunks
+    as they stream in; every top-level `{...}` object that completes is
+    returned as a dict, so steps can be sent before the array is closed.
+    Anything outside objects (``` fences, commas, the brackets) is skipped.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> list:
+        steps = []
+        for ch in chunk:
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._buffer = [ch]
+                continue
+
+            self._buffer.append(ch)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        steps.append(json.loads("".join(self._buffer)))
+                    except json.JSONDecodeError:
+                        print("⚠️ Warning: skipped a malformed learning-path step.")
+                    self._buffer = []
+        return steps
+
+
+async def _stream_llm_steps(user_data: dict, courses: list, high_demand):
+    parser = StepStreamParser()
+    compact = LEARNING_PATH_PROMPT == "compact"
+    number = 0
+    trends = await _trend_directions_async(high_demand)
+    # نفس المعاملات بالضبط عشان يشارك الكاش مع generate_learning_path_async
+    chunks = stream_chat_completion_async(async_client, **_completion_args(user_data, courses, high_demand, trends))
+    # aclosing: لما ينسكر هالـ generator ينسكر الـ stream تحته فوراً مش وقت الـ GC
+    async with aclosing(chunks):
+        async for chunk in chunks:
+            for step in parser.feed(chunk):
+                if compact:
+                    step = rehydrate_step(step, courses)
+                    if step is None:
+                        continue
+                    number += 1
+                    step["step"] = number
+                yield step
+
+
+async def stream_learning_path_async(user_data: dict, courses: list, high_demand=None, mode=None):
+    """
+    Yields each learning-path step (dict) as soon as the model finishes it.
+    If GPT fails or misses LEARNING_PATH_TIMEOUT before the first step, the
+    local planner's steps are yielded instead. After the first step only
+    LEARNING_PATH_IDLE_TIMEOUT between steps applies, so a long path that
+    keeps streaming is not cut off.
+    """
+    if high_demand is None:
+        high_demand = await fetch_market_insight_async(user_data.get("career_goal"))
+
+    if mode == "fast":
+        for step in plan_learning_path(user_data, courses, high_demand):
+            yield step
+        return
+
+    deadline = time.monotonic() + LEARNING_PATH_TIMEOUT
+    steps = _stream_llm_steps(user_data, courses, high_demand)
+    yielded = 0
+    reason = None
+    try:
+        while True:
+            # المهلة الكاملة لأول خطوة بس، بعدها مهلة خمول بين الخطوات
+            timeout = max(deadline - time.monotonic(), 0) if yielded == 0 else LEARNING_PATH_IDLE_TIMEOUT
+            try:
+                step = await asyncio.wait_for(steps.__anext__(), timeout)
+            except StopAsyncIteration:
+                break
+            yielded += 1
+            yield step
+    except asyncio.TimeoutError:
+        if yielded == 0:
+            reason = f"timeout after {LEARNING_PATH_TIMEOUT}s"
+        else:
+            reason = f"no new step for {LEARNING_PATH_IDLE_TIMEOUT}s"
+    except Exception as e:
+        print("Error streaming learning path:", str(e))
+        reason = type(e).__name__
+    finally:
+        await steps.aclose()
+
+    if yielded == 0:
+        for step in _fallback_steps(user_data, courses, high_demand, reason or "empty GPT output"):
+            yield step
+    elif reason:
+        # الخطوات اللي وصلت انرسلت، فنوقف هنا بدل ما نخلطها بخطة ثانية
+        print(f"⚠️ Learning path stream cut short after {yielded} steps ({reason}).")
+
 # ---------------------------2----------------------
 # import os
 # from dotenv import load_dotenv
@@ -0,0 +1,168 @@
+# search_cache.py
+"""
+Result cache for keyword course searches. Keys are the normalized keyword
+set (sorted, case-folded, de-duplicated) plus mode and limit; values are
+compact row tuples. The whole cache is dropped when the catalog version
+changes (checked every COURSE_CACHE_VERSION_INTERVAL seconds, or bumped
+directly by an importer running in the same process).
+"""
+import os
+import sys
+import time
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+load_dotenv()
+
+COURSE_CACHE_MAX_BYTES = int(os.getenv("COURSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+COURSE_CACHE_VERSION_INTERVAL = float(os.getenv("COURSE_CACHE_VERSION_INTERVAL", "60"))
+
+# عداد يزيده trigger على courses مع أي إضافة أو تعديل أو حذف (db_bootstrap.py catalog)
+CATALOG_VERSION = text("SELECT version FROM catalog_version")
+
+def normalize_keywords(keywords: list) -> tuple:
+    return tuple(sorted({k.strip().casefold() for k in keywords if k and k.strip()}))
+
+
+def make_key(keywords: list, limit: int, mode: str, extra=None) -> tuple:
+    return (mode, normalize_keywords(keywords), limit, extra)
+
+
+def _sizeof(fields, rows):
+    """Rough deep size of the cached tuples (strings dominate)."""
+    size = sys.getsizeof(fields) + sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return size
+
+
+class SearchCache:
+    def __init__(self, max_bytes=COURSE_CACHE_MAX_BYTES, version_interval=COURSE_CACHE_VERSION_INTERVAL):
+        self.max_bytes = max_bytes
+        self.version_interval = version_interval
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (fields, rows, size)
+        self._bytes = 0
+        self.version = None
+        self._next_version_check = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # ---------- catalog version ----------
+    def set_version(self, version):
+        """Drop every entry if the catalog changed since the last check."""
+        with self._lock:
+            if version == self.version:
+                return False
+            changed = self.version is not None
+            self.version = version
+            if changed:
+                self._entries.clear()
+                self._bytes = 0
+                self.invalidations += 1
+        if changed:
+            print(f"[Course cache] 🔄 catalog changed ({version}), cache cleared")
+        return changed
+
+    def bump(self):
+        """For importers in this process: invalidate now instead of waiting for the next check."""
+        self.set_version(("bumped", time.time()))
+        self._next_version_check = 0.0
+
+    def _version_due(self):
+        now = time.time()
+        if now < self._next_version_check:
+            return False
+        # نحجز الفحص قبل الاستعلام عشان ما يفحص كل طلب متزامن
+        self._next_version_check = now + self.version_interval
+        return True
+
+    def check_version(self, engine):
+        if not self._version_due():
+            return
+        try:
+            with engine.connect() as conn:
+                self.set_version(conn.execute(CATALOG_VERSION).scalar_one())
+        except Exception as e:
+            self._version_failed(e)
+
+    async def check_version_async(self, async_engine):
+        if not self._version_due():
+            return
+        try:
+            async with async_engine.connect() as conn:
+                self.set_version((await conn.execute(CATALOG_VERSION)).scalar_one())
+        except Exception as e:
+            self._version_failed(e)
+
+    def _version_failed(self, error):
+        # بدون نسخة ما نعرف إذا الكتالوج تغير، فما نخلي نتائج أقدم من فترة فحص وحدة
+        print(f"[Course cache] ⚠️ فشل فحص نسخة الكتالوج: {error}")
+        self.set_version(("unknown", time.time()))
+
+    # ---------- entries ----------
+    def get(self, key):
+        """List of fresh course dicts, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        fields, rows, _ = entry
+        return [dict(zip(fields, row)) for row in rows]
+
+    def set(self, key, courses: list, version):
+        """
+        Store a result. Pass the `version` read before running the query: if
+        the catalog changed meanwhile the (possibly stale) rows are dropped.
+        """
+        if not courses:
+            fields, rows = (), ()
+        else:
+            fields = tuple(courses[0])
+            rows = tuple(tuple(course[f] for f in fields) for course in courses)
+        size = _sizeof(fields, rows)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if version != self.version:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (fields, rows, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "catalog_version": str(self.version),
+            }
+
+
+course_cache = SearchCache()
@@ -0,0 +1,87 @@
+# single_flight.py
+"""
+Request coalescing: while a call for a key is in flight, identical calls
+wait for its result instead of going upstream again. Works for threads
+(`do`) and for coroutines on the event loop (`do_async`).
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+
+_groups = {}
+
+
+def make_key(*parts):
+    """Normalize call arguments: case/whitespace-insensitive strings, lists as tuples."""
+    key = []
+    for part in parts:
+        if isinstance(part, str):
+            key.append(" ".join(part.casefold().split()))
+        elif isinstance(part, (list, tuple)):
+            key.append(make_key(*part))
+        else:
+            key.append(part)
+    return tuple(key)
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}        # key -> concurrent.futures.Future
+        self._async_calls = {}  # key -> asyncio.Task
+        self.leaders = 0
+        self.coalesced = 0
+        _groups[name] = self
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        task = self._async_calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._async_calls[key] = task
+            task.add_done_callback(lambda _: self._async_calls.pop(key, None))
+            with self._lock:
+                self.leaders += 1
+        else:
+            with self._lock:
+                self.coalesced += 1
+        # shield: لو انلغى أحد المنتظرين (timeout مثلاً) الباقي يكملوا
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls = self.leaders + self.coalesced
+            return {
+                "calls": calls,
+                "upstream": self.leaders,
+                "coalesced": self.coalesced,
+                "coalesced_ratio": round(self.coalesced / calls, 3) if calls else 0.0,
+                "in_flight": len(self._calls) + len(self._async_calls),
+            }
+
+
+def stats() -> dict:
+    return {name: group.stats() for name, group in _groups.items()}
@@ -0,0 +1,104 @@
+# skill_extractor.py
+"""
+Local skill extraction from job descriptions (no GPT call).
+
+Every alias in the skill taxonomy is compiled into one Aho-Corasick
+automaton over *tokens* (the same tokenization as skill_taxonomy), so all
+descriptions are scanned in a single linear pass and matches always fall
+on word boundaries. Skills are counted once per posting and bucketed by the
+taxonomy's tier labels.
+"""
+import os
+from collections import Counter, deque
+from skill_taxonomy import taxonomy, tokenize
+
+# عدد المهارات اللي نرجعها من سوق العمل
+LOCAL_SKILLS_TOP_N = int(os.getenv("LOCAL_SKILLS_TOP_N", "30"))
+# تحليل GPT للأوصاف صار اختياري (إثراء فوق النتيجة المحلية)
+MARKET_SKILLS_GPT = os.getenv("MARKET_SKILLS_GPT", "0") == "1"
+
+# aliases تطلع كثير كلمات عادية بإعلانات الوظائف ("go above and beyond", "c-level")
+AMBIGUOUS_ALIASES = frozenset({
+    "go", "c", "r", "ts", "tf", "py", "dl", "cv", "ui", "ios", "shell", "express", "spring",
+    "node", "security", "testing", "cloud", "rest", "analytics", "visualization", "stats",
+    "containers", "embedded", "torch", "collaboration", "qa",
+})
+
+
+class SkillMatcher:
+    """Token-level Aho-Corasick automaton over taxonomy aliases."""
+
+    def __init__(self, aliases):
+        self.goto = [{}]   # state -> {token: next state}
+        self.fail = [0]
+        self.output = [()]  # state -> skill ids that end here (including via fail links)
+
+        for alias, skill_id in aliases:
+            state = 0
+            for token in alias.split():
+                nxt = self.goto[state].get(token)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][token] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                state = nxt
+            self.output[state] = self.output[state] + (skill_id,)
+
+        # روابط الفشل بالـ BFS
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and token not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(token, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                if self.output[self.fail[nxt]]:
+                    self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def find(self, tokens) -> set:
+        """Skill ids mentioned in a token sequence."""
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        state = 0
+        for token in tokens:
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+matcher = SkillMatcher(
+    (alias, skill_id) for alias, skill_id in taxonomy.aliases() if alias not in AMBIGUOUS_ALIASES
+)
+
+
+def posting_skills(description) -> set:
+    """Canonical skills mentioned in one posting."""
+    return {taxonomy.names[skill_id] for skill_id in matcher.find(tokenize(description))}
+
+
+def count_skills(descriptions) -> Counter:
+    """Number of postings mentioning each canonical skill."""
+    counts = Counter()
+    for description in descriptions:
+        counts.update(matcher.find(tokenize(description)))
+    return Counter({taxonomy.names[skill_id]: n for skill_id, n in counts.items()})
+
+
+def top_skills(descriptions, top_n=LOCAL_SKILLS_TOP_N) -> list:
+    return [skill for skill, _ in count_skills(descriptions).most_common(top_n)]
+
+
+def extract_skills_by_tier(descriptions, top_n=LOCAL_SKILLS_TOP_N) -> dict:
+    """Same shape as the GPT extractor: {"foundation": [...], "core": [...], "advanced": [...]}."""
+    buckets = {level: [] for level in taxonomy.tiers}
+    for skill in top_skills(descriptions, top_n):
+        buckets[taxonomy.tier(skill)].append(skill)
+    return buckets
@@ -0,0 +1,161 @@
+# skill_taxonomy.py
+"""
+Skill canonicalization: "python", "Python 3" and "py" all become "Python".
+
+The alias table lives in skill_taxonomy.json (bump "version" when it
+changes; the version is part of anything cached from canonical names).
+It is loaded into a dict from normalized form -> skill id, plus a token
+trie used for phrases that only start with a known skill
+("Django framework", "Python 3.11 programming").
+"""
+import os
+import re
+import json
+from functools import lru_cache
+
+SKILL_TAXONOMY_PATH = os.getenv(
+    "SKILL_TAXONOMY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "skill_taxonomy.json")
+)
+
+# نحتفظ بـ + و # و . عشان C++ و C# و Node.js و .NET
+TOKEN_RE = re.compile(r"[\w+#.]+")
+VERSION_RE = re.compile(r"^v?\d+(\.\d+)*x?$")
+# كلمات ما تغير المهارة: "Django framework" = "Django"
+FILLER = frozenset({
+    "programming", "language", "development", "developer", "framework", "library", "basics",
+    "fundamentals", "essentials", "skills", "knowledge", "experience", "concepts", "and",
+    "beginner", "intermediate", "advanced", "proficiency", "tools",
+})
+_END = ""  # مفتاح نهاية الكلمة في الـ trie
+
+
+def tokenize(value) -> list:
+    tokens = (t.rstrip(".") for t in TOKEN_RE.findall(str(value or "").casefold().replace("_", " ")))
+    return [t for t in tokens if t]
+
+
+def normalize(value) -> str:
+    return " ".join(tokenize(value))
+
+
+class SkillTaxonomy:
+    def __init__(self, path=SKILL_TAXONOMY_PATH):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        self.version = data["version"]
+        self.tiers = tuple(data["tiers"])
+        self.names = []      # skill id -> canonical name
+        self.skill_tiers = []  # skill id -> tier label
+        self.lookup = {}     # normalized alias -> skill id
+        self.trie = {}
+
+        for skill_id, entry in enumerate(data["skills"]):
+            self.names.append(entry["name"])
+            self.skill_tiers.append(entry["tier"])
+            for alias in (entry["name"], *entry.get("aliases", ())):
+                tokens = tokenize(alias)
+                if not tokens:
+                    continue
+                # أول تعريف يفوز لو تكرر alias
+                self.lookup.setdefault(" ".join(tokens), skill_id)
+                node = self.trie
+                for token in tokens:
+                    node = node.setdefault(token, {})
+                node.setdefault(_END, skill_id)
+
+        self._resolve = lru_cache(maxsize=8192)(self._resolve_uncached)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _longest_prefix(self, tokens):
+        node, match, end = self.trie, None, 0
+        for i, token in enumerate(tokens):
+            node = node.get(token)
+            if node is None:
+                break
+            if _END in node:
+                match, end = node[_END], i + 1
+        return match, end
+
+    def _resolve_uncached(self, value: str):
+        """(skill id or None, normalized form)."""
+        tokens = tokenize(value)
+        normalized = " ".join(tokens)
+        skill_id = self.lookup.get(normalized)
+        if skill_id is not None:
+            return skill_id, normalized
+
+        core = [t for t in tokens if t not in FILLER and not VERSION_RE.match(t)] or tokens
+        skill_id = self.lookup.get(" ".join(core))
+        if skill_id is not None:
+            return skill_id, normalized
+
+        skill_id, end = self._longest_prefix(core)
+        if skill_id is not None and end == len(core):
+            return skill_id, normalized
+        return None, normalized
+
+    def canonical(self, skill: str) -> str:
+        """Canonical name, or the trimmed input when the skill is unknown."""
+        skill_id, _ = self._resolve(skill)
+        return self.names[skill_id] if skill_id is not None else " ".join(str(skill or "").split())
+
+    def tier(self, skill: str):
+        skill_id, _ = self._resolve(skill)
+        return self.skill_tiers[skill_id] if skill_id is not None else None
+
+    def canonicalize(self, skills) -> list:
+        """Canonical names, de-duplicated, in first-seen order; unknown skills are kept as typed."""
+        seen = set()
+        result = []
+        for skill in skills or ():
+            skill_id, normalized = self._resolve(skill)
+            if not normalized:
+                continue
+            key = skill_id if skill_id is not None else normalized
+            if key in seen:
+                continue
+            seen.add(key)
+            result.append(self.names[skill_id] if skill_id is not None else " ".join(str(skill).split()))
+        return result
+
+    def complete(self, prefix: str, limit=10) -> list:
+        """Canonical skills whose name or alias starts with `prefix` (autocomplete)."""
+        tokens = tokenize(prefix)
+        if not tokens:
+            return []
+        node = self.trie
+        for token in tokens[:-1]:
+            node = node.get(token)
+            if node is None:
+                return []
+        last = tokens[-1]
+        stack = [child for token, child in node.items() if token != _END and token.startswith(last)]
+        found = []
+        while stack and len(found) < limit:
+            current = stack.pop()
+            skill_id = current.get(_END)
+            if skill_id is not None and self.names[skill_id] not in found:
+                found.append(self.names[skill_id])
+            stack.extend(child for token, child in current.items() if token != _END)
+        return found
+
+    def aliases(self):
+        """(normalized alias, skill id) pairs, e.g. to build a text matcher."""
+        return self.lookup.items()
+
+
+taxonomy = SkillTaxonomy()
+
+
+def canonicalize(skills) -> list:
+    return taxonomy.canonicalize(skills)
+
+
+def canonical(skill: str) -> str:
+    return taxonomy.canonical(skill)
+
+
+def tier(skill: str):
+    return taxonomy.tier(skill)
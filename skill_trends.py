@@ -0,0 +1,236 @@
+# skill_trends.py
+"""
+Skill demand trends from the job-postings store.
+
+Counters live in skill_demand_weekly (postings per country, skill and
+week) and job_posting_weekly (all postings per country and week). They are
+bumped in the same transaction that inserts new postings
+(job_store.counter_statements), so they are never recomputed by scanning
+postings; `rebuild` exists only for backfilling.
+
+A skill's trend compares its share of postings in the last
+TREND_WINDOW_WEEKS weeks with the window before, so harvesting more pages
+in one week doesn't look like rising demand for everything.
+
+    python skill_trends.py "data analyst" --country us
+    python skill_trends.py --rebuild
+"""
+import os
+import time
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import text
+from database import engine, async_engine
+from job_store import normalize_key, week_start, ensure_tables, JOB_STORE_MAX_AGE_DAYS
+
+load_dotenv()
+
+TREND_WINDOW_WEEKS = int(os.getenv("TREND_WINDOW_WEEKS", "4"))
+# مهارة بأقل من هالعدد من الوظائف بالنافذتين ما نحكم على اتجاهها
+TREND_MIN_POSTINGS = int(os.getenv("TREND_MIN_POSTINGS", "5"))
+# تغير بالحصة أكبر من 20% = rising / declining
+TREND_THRESHOLD = float(os.getenv("TREND_THRESHOLD", "0.2"))
+TREND_CACHE_SECONDS = float(os.getenv("TREND_CACHE_SECONDS", "600"))
+
+SERIES = text("""
+    SELECT skill, week, postings FROM skill_demand_weekly
+    WHERE country = :country AND week >= :since
+""")
+GOAL_SERIES = text("""
+    WITH goal_skills AS (
+        SELECT DISTINCT s.skill
+        FROM job_posting_searches q
+        JOIN job_posting_skills s ON s.posting_id = q.posting_id
+        WHERE q.career_goal = :goal AND q.country = :country AND q.seen_at >= :seen_since
+    )
+    SELECT d.skill, d.week, d.postings
+    FROM skill_demand_weekly d
+    JOIN goal_skills g ON g.skill = d.skill
+    WHERE d.country = :country AND d.week >= :since
+""")
+VOLUME = text("""
+    SELECT week, postings FROM job_posting_weekly
+    WHERE country = :country AND week >= :since
+""")
+REBUILD = [
+    "TRUNCATE skill_demand_weekly, job_posting_weekly",
+    """
+    INSERT INTO skill_demand_weekly (country, skill, week, postings)
+    SELECT p.country, s.skill, date_trunc('week', coalesce(p.created, p.ingested_at))::date, count(*)
+    FROM job_postings p JOIN job_posting_skills s ON s.posting_id = p.id
+    GROUP BY 1, 2, 3
+    """,
+    """
+    INSERT INTO job_posting_weekly (country, week, postings)
+    SELECT country, date_trunc('week', coalesce(created, ingested_at))::date, count(*)
+    FROM job_postings
+    GROUP BY 1, 2
+    """,
+]
+
+_snapshots = {}  # country -> (loaded_at, {skill: trend row})
+
+
+# -------------------------------------------
+# 🔹 العدادات
+# -------------------------------------------
+def rebuild():
+    """Recompute every counter from job_postings (backfill only)."""
+    ensure_tables()
+    with engine.begin() as conn:
+        for statement in REBUILD:
+            conn.execute(text(statement))
+    _snapshots.clear()
+    print("[Skill trends] ✅ تم إعادة بناء العدادات")
+
+
+# -------------------------------------------
+# 🔹 حساب الاتجاه
+# -------------------------------------------
+def _windows(weeks=TREND_WINDOW_WEEKS):
+    """(first week of the recent window, first week of the previous window)."""
+    current = week_start(datetime.utcnow())
+    recent_from = current - timedelta(weeks=weeks - 1)
+    return recent_from, recent_from - timedelta(weeks=weeks)
+
+
+def _direction(change):
+    if change >= TREND_THRESHOLD:
+        return "rising"
+    if change <= -TREND_THRESHOLD:
+        return "declining"
+    return "stable"
+
+
+def _trend_rows(series, volume, recent_from, min_postings=TREND_MIN_POSTINGS):
+    recent_total = sum(n for week, n in volume if week >= recent_from)
+    previous_total = sum(n for week, n in volume if week < recent_from)
+    # بدون تاريخ بالنافذتين كل شي بيطلع rising
+    if not recent_total or not previous_total:
+        return []
+
+    counts = defaultdict(lambda: [0, 0])
+    for skill, week, n in series:
+        counts[skill][0 if week >= recent_from else 1] += n
+
+    rows = []
+    for skill, (recent, previous) in counts.items():
+        if recent + previous < min_postings:
+            continue
+        # smoothing بسيط عشان مهارة جديدة (previous = 0) ما تعطي قسمة على صفر
+        change = ((recent + 0.5) / (recent_total + 1)) / ((previous + 0.5) / (previous_total + 1)) - 1
+        rows.append({
+            "skill": skill,
+            "recent": recent,
+            "previous": previous,
+            "change": round(change, 3),
+            "direction": _direction(change),
+        })
+    return rows
+
+
+def _params(career_goal, country):
+    goal, country = normalize_key(career_goal, country)
+    recent_from, since = _windows()
+    return {
+        "goal": goal,
+        "country": country,
+        "since": since,
+        # نفس نافذة job_store: مهارات الوظائف اللي شفناها مؤخراً لهالهدف المهني
+        "seen_since": datetime.utcnow() - timedelta(days=JOB_STORE_MAX_AGE_DAYS),
+    }, recent_from
+
+
+def _risers_decliners(rows, limit):
+    risers = sorted((r for r in rows if r["direction"] == "rising"), key=lambda r: -r["change"])
+    decliners = sorted((r for r in rows if r["direction"] == "declining"), key=lambda r: r["change"])
+    return {"risers": risers[:limit], "decliners": decliners[:limit]}
+
+
+def trends(career_goal=None, country="us", limit=10) -> dict:
+    """Top risers and decliners among the goal's skills (all skills when no goal)."""
+    params, recent_from = _params(career_goal, country)
+    with engine.connect() as conn:
+        series = conn.execute(GOAL_SERIES if params["goal"] else SERIES, params).all()
+        volume = conn.execute(VOLUME, params).all()
+    return _risers_decliners(_trend_rows(series, volume, recent_from), limit)
+
+
+async def trends_async(career_goal=None, country="us", limit=10) -> dict:
+    params, recent_from = _params(career_goal, country)
+    async with async_engine.connect() as conn:
+        series = (await conn.execute(GOAL_SERIES if params["goal"] else SERIES, params)).all()
+        volume = (await conn.execute(VOLUME, params)).all()
+    return _risers_decliners(_trend_rows(series, volume, recent_from), limit)
+
+
+# -------------------------------------------
+# 🔹 للـ prompt: snapshot بالذاكرة لكل دولة
+# -------------------------------------------
+def _fresh_snapshot(country):
+    entry = _snapshots.get(country)
+    if entry and time.time() - entry[0] < TREND_CACHE_SECONDS:
+        return entry[1]
+    return None
+
+
+def _store_snapshot(country, rows):
+    snapshot = {row["skill"]: row for row in rows}
+    _snapshots[country] = (time.time(), snapshot)
+    return snapshot
+
+
+def _directions(snapshot, skills) -> dict:
+    """{"rising": [...], "declining": [...]} for the given skills."""
+    result = {"rising": [], "declining": []}
+    for skill in skills or ():
+        row = snapshot.get(skill)
+        if row and row["direction"] in result:
+            result[row["direction"]].append(skill)
+    return result
+
+
+def directions(skills, country="us") -> dict:
+    """Trend direction of the given canonical skills, from a per-country snapshot. Never raises."""
+    params, recent_from = _params(None, country)
+    snapshot = _fresh_snapshot(params["country"])
+    if snapshot is None:
+        try:
+            with engine.connect() as conn:
+                series = conn.execute(SERIES, params).all()
+                volume = conn.execute(VOLUME, params).all()
+            snapshot = _store_snapshot(params["country"], _trend_rows(series, volume, recent_from))
+        except Exception as e:
+            print(f"[Skill trends] ⚠️ فشل تحميل الاتجاهات: {e}")
+            snapshot = _store_snapshot(params["country"], [])
+    return _directions(snapshot, skills)
+
+
+async def directions_async(skills, country="us") -> dict:
+    params, recent_from = _params(None, country)
+    snapshot = _fresh_snapshot(params["country"])
+    if snapshot is None:
+        try:
+            async with async_engine.connect() as conn:
+                series = (await conn.execute(SERIES, params)).all()
+                volume = (await conn.execute(VOLUME, params)).all()
+            snapshot = _store_snapshot(params["country"], _trend_rows(series, volume, recent_from))
+        except Exception as e:
+            print(f"[Skill trends] ⚠️ فشل تحميل الاتجاهات: {e}")
+            snapshot = _store_snapshot(params["country"], [])
+    return _directions(snapshot, skills)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Skill demand risers and decliners")
+    parser.add_argument("career_goal", nargs="?")
+    parser.add_argument("--country", default="us")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--rebuild", action="store_true", help="recompute the counters from job_postings")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        rebuild()
+    print(trends(args.career_goal, args.country, args.limit))
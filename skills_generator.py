@@ -1,59 +1,86 @@
-
 # skills_generator.py
 import os
 import json
-import requests
+import asyncio
 from dotenv import load_dotenv
-from openai import OpenAI
+from llm_cache import cached_chat_completion, cached_chat_completion_async
+from openai import OpenAI, AsyncOpenAI
+from adzuna_client import adzuna
+import job_store
+from single_flight import SingleFlight, make_key
+from skill_taxonomy import canonicalize
+from skill_extractor import extract_skills_by_tier, MARKET_SKILLS_GPT
+import metrics
 
 load_dotenv()
 
 # -------------------------------------------
 # 🔑 تحميل مفاتيح البيئة
 # -------------------------------------------
-ADZUNA_APP_ID = os.getenv("ADZUNA_APP_ID")
-ADZUNA_APP_KEY = os.getenv("ADZUNA_APP_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 client = OpenAI(api_key=OPENAI_API_KEY)
+async_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+
+# مهلة كل فرع في generate_combined_skills_async (بالثواني)
+MARKET_BRANCH_TIMEOUT = float(os.getenv("MARKET_BRANCH_TIMEOUT", "8"))
+AI_BRANCH_TIMEOUT = float(os.getenv("AI_BRANCH_TIMEOUT", "15"))
+
+SKILL_LEVELS = ("foundation", "core", "advanced")
+
+
+def _empty_skills():
+    return {level: [] for level in SKILL_LEVELS}
+
+# الطلبات المتطابقة اللي توصل بنفس اللحظة (فصل كامل مثلاً) تشترك بنداء واحد
+_jobs_flight = SingleFlight("job_descriptions")
+_extract_flight = SingleFlight("extract_skills")
+_required_flight = SingleFlight("required_skills")
 
 # -------------------------------------------
 # 🔹 1. جلب أوصاف الوظائف من Adzuna
 # -------------------------------------------
-def get_job_descriptions(career_goal: str, country="us"):
+def _descriptions_from_results(results, country):
+    print(f"[Adzuna] ✅ تم جلب {len(results)} وظيفة من سوق العمل ({country.upper()})")
+    return [r.get("description", "") for r in results if r.get("description")]
+
+
+def _get_job_descriptions(career_goal: str, country="us"):
     """
     جلب أوصاف الوظائف من Adzuna بناءً على الهدف المهني
     """
-    url = f"https://api.adzuna.com/v1/api/jobs/{country}/search/1"
-    params = {
-        "app_id": ADZUNA_APP_ID,
-        "app_key": ADZUNA_APP_KEY,
-        "what": career_goal,
-        "results_per_page": 10,
-        "content-type": "application/json"
-    }
-
     try:
-        response = requests.get(url, params=params)
-        if response.status_code != 200:
-            print(f"[Adzuna] ❌ فشل في الاتصال (الكود: {response.status_code})")
-            return []
+        results = adzuna.search(country, career_goal, 10)
+        job_store.ingest(results, career_goal, country)
+        return _descriptions_from_results(results, country)
+    except Exception as e:
+        print(f"[Adzuna] ⚠️ خطأ أثناء الجلب: {e}")
+        return []
 
-        data = response.json()
-        results = data.get("results", [])
-        print(f"[Adzuna] ✅ تم جلب {len(results)} وظيفة من سوق العمل ({country.upper()})")
 
-        return [r.get("description", "") for r in results if r.get("description")]
+async def _get_job_descriptions_async(career_goal: str, country="us"):
+    try:
+        results = await adzuna.search_async(country, career_goal, 10)
+        await job_store.ingest_async(results, career_goal, country)
+        return _descriptions_from_results(results, country)
     except Exception as e:
         print(f"[Adzuna] ⚠️ خطأ أثناء الجلب: {e}")
         return []
 
+
+def get_job_descriptions(career_goal: str, country="us"):
+    return _jobs_flight.do(make_key(career_goal, country), _get_job_descriptions, career_goal, country)
+
+
+async def get_job_descriptions_async(career_goal: str, country="us"):
+    return await _jobs_flight.do_async(make_key(career_goal, country), _get_job_descriptions_async, career_goal, country)
+
 # -------------------------------------------
 # 🔹 2. تحليل النصوص واستخراج المهارات عبر GPT
 # -------------------------------------------
-def extract_skills_from_text(job_descriptions):
+def _extract_skills_prompt(job_descriptions):
     combined_text = " ".join(job_descriptions)
-    prompt = f"""
+    return f"""
     Analyze the following real job descriptions and extract the most in-demand skills.
     Return ONLY a valid JSON with 3 categories:
     {{
@@ -66,25 +93,60 @@ def extract_skills_from_text(job_descriptions):
     {combined_text[:5000]}
     """
 
-    response = client.chat.completions.create(
+
+def _parse_skills_json(content):
+    with metrics.timed("json_parse"):
+        clean = content.strip()
+        clean = clean.replace("```json", "").replace("```", "").strip()
+        try:
+            return json.loads(clean)
+        except ValueError:
+            metrics.failures.inc("openai", "invalid_json")
+            raise
+
+
+def _extract_skills_from_text(job_descriptions):
+    content = cached_chat_completion(
+        client,
         model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
+        messages=[{"role": "user", "content": _extract_skills_prompt(job_descriptions)}],
         temperature=0.3,
     )
 
     try:
-        clean = response.choices[0].message.content.strip()
-        clean = clean.replace("```json", "").replace("```", "").strip()
-        return json.loads(clean)
+        return _parse_skills_json(content)
+    except Exception as e:
+        print("⚠️ خطأ في تحليل استجابة GPT:", e)
+        return _empty_skills()
+
+
+async def _extract_skills_from_text_async(job_descriptions):
+    content = await cached_chat_completion_async(
+        async_client,
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": _extract_skills_prompt(job_descriptions)}],
+        temperature=0.3,
+    )
+
+    try:
+        return _parse_skills_json(content)
     except Exception as e:
         print("⚠️ خطأ في تحليل استجابة GPT:", e)
-        return {"foundation": [], "core": [], "advanced": []}
+        return _empty_skills()
+
+
+def extract_skills_from_text(job_descriptions):
+    return _extract_flight.do(make_key(job_descriptions), _extract_skills_from_text, job_descriptions)
+
+
+async def extract_skills_from_text_async(job_descriptions):
+    return await _extract_flight.do_async(make_key(job_descriptions), _extract_skills_from_text_async, job_descriptions)
 
 # -------------------------------------------
 # 🔹 3. توليد المهارات بناءً على تخصص المستخدم وهدفه
 # -------------------------------------------
-def generate_required_skills(specialization: str, career_goal: str):
-    prompt = f"""
+def _required_skills_prompt(specialization, career_goal):
+    return f"""
     You are an expert career advisor.
     Based on the following information, generate a list of essential skills:
 
@@ -104,23 +166,61 @@ def generate_required_skills(specialization: str, career_goal: str):
     }}
     """
 
-    response = client.chat.completions.create(
+
+def _generate_required_skills(specialization: str, career_goal: str):
+    content = cached_chat_completion(
+        client,
         model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
+        messages=[{"role": "user", "content": _required_skills_prompt(specialization, career_goal)}],
         temperature=0.3,
         max_tokens=400,
     )
 
     try:
-        clean = response.choices[0].message.content.strip()
-        clean = clean.replace("```json", "").replace("```", "").strip()
-        return json.loads(clean)
+        return _parse_skills_json(content)
+    except Exception:
+        return _empty_skills()
+
+
+async def _generate_required_skills_async(specialization: str, career_goal: str):
+    content = await cached_chat_completion_async(
+        async_client,
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": _required_skills_prompt(specialization, career_goal)}],
+        temperature=0.3,
+        max_tokens=400,
+    )
+
+    try:
+        return _parse_skills_json(content)
     except Exception:
-        return {"foundation": [], "core": [], "advanced": []}
+        return _empty_skills()
+
+
+def generate_required_skills(specialization: str, career_goal: str):
+    key = make_key(specialization, career_goal)
+    return _required_flight.do(key, _generate_required_skills, specialization, career_goal)
+
+
+async def generate_required_skills_async(specialization: str, career_goal: str):
+    key = make_key(specialization, career_goal)
+    return await _required_flight.do_async(key, _generate_required_skills_async, specialization, career_goal)
 
 # -------------------------------------------
 # 🔹 4. دمج المهارات من Adzuna و GPT
 # -------------------------------------------
+def _merge_skills(ai_skills, market_skills):
+    # دمج النتيجتين بدون تكرار بعد توحيد الأسماء ("python" و "Python 3" = "Python")
+    merged = {}
+    seen = set()
+    for level in SKILL_LEVELS:
+        skills = canonicalize(ai_skills.get(level, []) + market_skills.get(level, []))
+        # المهارة تظهر بأول مستوى فقط
+        merged[level] = [s for s in skills if s.casefold() not in seen]
+        seen.update(s.casefold() for s in merged[level])
+    return merged
+
+
 def generate_combined_skills(specialization: str, career_goal: str, country="us"):
     """
     يجمع بين تحليل سوق العمل (Adzuna) والتحليل الذكي من GPT
@@ -128,24 +228,59 @@ def generate_combined_skills(specialization: str, career_goal: str, country="us"
     """
     print(f"\n🔍 تحليل سوق العمل لمجال: {career_goal}")
 
-    # المهارات من سوق العمل
+    # المهارات من سوق العمل (استخراج محلي، و GPT فقط لو MARKET_SKILLS_GPT=1)
     job_descriptions = get_job_descriptions(career_goal, country)
     if job_descriptions:
-        market_skills = extract_skills_from_text(job_descriptions)
+        market_skills = extract_skills_by_tier(job_descriptions)
+        if MARKET_SKILLS_GPT:
+            market_skills = _merge_skills(market_skills, extract_skills_from_text(job_descriptions))
     else:
-        market_skills = {"foundation": [], "core": [], "advanced": []}
+        market_skills = _empty_skills()
 
     # المهارات من GPT حسب التخصص
     ai_skills = generate_required_skills(specialization, career_goal)
 
-    # دمج النتيجتين بدون تكرار
-    combined = {
-        "foundation": list(set(ai_skills["foundation"] + market_skills["foundation"])),
-        "core": list(set(ai_skills["core"] + market_skills["core"])),
-        "advanced": list(set(ai_skills["advanced"] + market_skills["advanced"]))
-    }
+    return _merge_skills(ai_skills, market_skills)
+
+
+async def _market_branch(career_goal: str, country: str):
+    # Adzuna ثم الاستخراج المحلي (و GPT كإثراء اختياري)
+    job_descriptions = await get_job_descriptions_async(career_goal, country)
+    if not job_descriptions:
+        return _empty_skills()
+    market_skills = extract_skills_by_tier(job_descriptions)
+    if MARKET_SKILLS_GPT:
+        market_skills = _merge_skills(market_skills, await extract_skills_from_text_async(job_descriptions))
+    return market_skills
+
+
+async def _run_branch(name: str, coro, timeout: float, dropped: list):
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        print(f"⏱️ الفرع '{name}' تجاوز المهلة ({timeout}s) وتم تجاهله")
+    except Exception as e:
+        print(f"⚠️ الفرع '{name}' فشل: {e}")
+    dropped.append(name)
+    return _empty_skills()
+
+
+async def generate_combined_skills_async(specialization: str, career_goal: str, country="us"):
+    """
+    نسخة async من generate_combined_skills: فرع سوق العمل (Adzuna → استخراج محلي)
+    وفرع GPT حسب التخصص يشتغلوا بالتوازي، ولكل فرع مهلة خاصة.
+    Returns (combined, dropped) where `dropped` names the branches
+    ("market" / "ai") that timed out or failed and were left out.
+    """
+    print(f"\n🔍 تحليل سوق العمل لمجال: {career_goal}")
+
+    dropped = []
+    market_skills, ai_skills = await asyncio.gather(
+        _run_branch("market", _market_branch(career_goal, country), MARKET_BRANCH_TIMEOUT, dropped),
+        _run_branch("ai", generate_required_skills_async(specialization, career_goal), AI_BRANCH_TIMEOUT, dropped),
+    )
 
-    return combined
+    return _merge_skills(ai_skills, market_skills), dropped
 
 # -------------------------------------------
 # 🔹 5. اختبار محلي (اختياري)